@@ -0,0 +1,115 @@
+import math
+import time
+import logging
+import threading
+from concurrent.futures import Future
+
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """
+    Allows rate calls per second, in bursts of up to burst, counted in
+    Django's cache so that every process using the same cache shares one
+    budget.
+
+    Calls are counted in fixed windows of burst / rate seconds, each
+    allowing burst calls, so two bursts may meet at a window boundary. With
+    a per-process cache backend, such as the default LocMemCache, each
+    process has a budget of its own.
+    """
+
+    def __init__(self, rate, burst, key):
+        self.burst = burst
+        self.window = burst / rate
+        self.key = key
+
+    def acquire(self):
+        """
+        Block until a call is allowed.
+        """
+        while True:
+            now = time.time()
+            window = int(now // self.window)
+            key = f"{self.key}:{window}"
+            # add() is atomic, so only the first caller creates the counter
+            cache.add(key, 0, timeout = math.ceil(self.window) + 1)
+            try:
+                calls = cache.incr(key)
+            except ValueError:
+                # The counter expired between add() and incr()
+                continue
+            if calls <= self.burst:
+                return
+            time.sleep((window + 1) * self.window - now)
+
+
+class ClimateFetcher:
+    """
+    Fetches climate snapshots for grid cells on a single background thread.
+
+    Requests for a cell that is already queued share its future. Each pass
+    of the worker takes every queued cell as one batch. A cell whose fetch
+    failed is not refreshed in the background again until retry seconds
+    have passed. Pacing the upstream calls is left to load, which may find
+    the cell already fetched by another process.
+    """
+
+    def __init__(self, retry):
+        self.retry = retry
+        self.pending = {}
+        self.failed_until = {}
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.worker = None
+
+    def request(self, cell, load):
+        """
+        Queue load(cell) unless it is queued already.
+
+        Returns:
+            concurrent.futures.Future: Resolves to what load returned
+        """
+        with self.lock:
+            queued = self.pending.get(cell)
+            if queued is not None:
+                return queued[0]
+            future = Future()
+            self.pending[cell] = (future, load)
+            if self.worker is None:
+                self.worker = threading.Thread(target = self._run, daemon = True)
+                self.worker.start()
+        self.wakeup.set()
+        return future
+
+    def refresh_later(self, cell, load):
+        """
+        Queue a background refresh of cell, unless it recently failed.
+        """
+        if time.monotonic() < self.failed_until.get(cell, 0):
+            return
+        self.request(cell, load)
+
+    def _run(self):
+        while True:
+            self.wakeup.wait()
+            with self.lock:
+                self.wakeup.clear()
+                # Cells stay pending until fetched, so repeat requests merge
+                batch = list(self.pending.items())
+            for cell, (future, load) in batch:
+                try:
+                    result = load(cell)
+                except Exception as error:
+                    logger.warning("Climate fetch for %s failed", cell, exc_info = True)
+                    self.failed_until[cell] = time.monotonic() + self.retry
+                    with self.lock:
+                        del self.pending[cell]
+                    future.set_exception(error)
+                else:
+                    self.failed_until.pop(cell, None)
+                    with self.lock:
+                        del self.pending[cell]
+                    future.set_result(result)
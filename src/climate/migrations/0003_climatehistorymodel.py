@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('climate', '0002_climatemodel_delete_transientmodel'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClimateHistoryModel',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('lat', models.FloatField()),
+                ('lon', models.FloatField()),
+                ('recorded_at', models.DateTimeField()),
+                ('temp', models.FloatField(null=True)),
+                ('feels_like', models.FloatField(null=True)),
+                ('humidity', models.FloatField(null=True)),
+                ('pressure', models.FloatField(null=True)),
+                ('wind_speed', models.FloatField(null=True)),
+                ('clouds', models.FloatField(null=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('lat', 'lon', 'recorded_at'), name='climate_history_cell_time')],
+            },
+        ),
+    ]
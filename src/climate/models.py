@@ -1,13 +1,26 @@
 import os
-import requests
+import json
+import time
+import hashlib
+import logging
+from datetime import datetime, timezone as dt_timezone
 from collections import UserList
 from django.db import models
+from django.db import close_old_connections
+from django.db.models import Avg, Count, Max, Min
+from django.db.models.expressions import RawSQL
 from django.core import serializers
-from django.core.cache import caches
+from django.conf import settings
+from django.core.cache import cache
 from dotenv import load_dotenv
 
+from core import http
+from core.cache import TTLCache
+from climate.fetcher import ClimateFetcher, RateLimiter
+
 load_dotenv()
-CACHE = caches["default"]
+
+logger = logging.getLogger(__name__)
 
 # This functionality builds on an answer for the following SO question,
 # but not the accepted answer; this one is farther down in the post:
@@ -20,23 +33,144 @@ class ClimateModelManager(models.Manager):
     lat = os.getenv("OPENWEATHER_LAT")
     lon = os.getenv("OPENWEATHER_LON")
 
-    cache_key = "cached-transient-models"
-    cache_sentinel = object()
+    # Coordinates are snapped to a grid of this many degrees, so nearby
+    # requests share one snapshot
+    grid = settings.CLIMATE_GRID
+
+    # Snapshots are fresh for cache_timeout seconds; after that they are
+    # still served, while a background refresh runs, until max_staleness
     cache_timeout = 600
+    max_staleness = settings.CLIMATE_MAX_STALENESS
+
+    # Snapshots are held in this process and in Django's cache, where other
+    # processes find them; the upstream budget and the lock that lets one
+    # process at a time fetch a cell live there as well
+    snapshots = TTLCache(settings.CLIMATE_MAX_LOCATIONS, settings.CLIMATE_MAX_STALENESS)
+    limiter = RateLimiter(
+        rate = settings.CLIMATE_FETCH_RATE,
+        burst = settings.CLIMATE_FETCH_BURST,
+        key = "climate:fetches"
+    )
+    fetcher = ClimateFetcher(
+        retry = settings.CLIMATE_REFRESH_RETRY
+    )
 
     def get_queryset(self):
-        climate_model_data = CACHE.get(self.cache_key, self.cache_sentinel)
-        if climate_model_data is self.cache_sentinel:
-            response = requests.get(
-                 f"https://api.openweathermap.org/data/2.5/weather?lat={self.lat}&lon={self.lon}&appid={self.api}"
-            )
-            response.raise_for_status()
-            climate_model_data = response.json()
-            CACHE.set(self.cache_key, climate_model_data, self.cache_timeout)
+        snapshot = self.get_snapshot()
         return ClimateModelQueryset(
-            [ClimateModel(**climate_model_data)]
+            [ClimateModel(**snapshot["data"])]
+        )
+
+    def snap(self, lat = None, lon = None):
+        """
+        Return the grid cell for a location, defaulting to OPENWEATHER_LAT/LON.
+
+        Raises:
+            ValueError: If only one of lat and lon is given, no location is
+            given or configured, or it is invalid
+        """
+        if (lat is None) != (lon is None):
+            raise ValueError("Give both lat and lon, or neither")
+        lat = float(self.lat if lat is None else lat)
+        lon = float(self.lon if lon is None else lon)
+        if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+            raise ValueError("Coordinates out of range")
+        return (
+            round(round(lat / self.grid) * self.grid, 6),
+            round(round(lon / self.grid) * self.grid, 6)
         )
 
+    def get_snapshot(self, cell = None):
+        """
+        Return the snapshot for a grid cell (see snap; by default the configured
+        location): the raw upstream data, its fetch time, and the JSON response
+        body with its ETag, encoded once per refresh.
+        """
+        if cell is None:
+            cell = self.snap()
+        snapshot = self.snapshots.get(cell)
+        if snapshot is None:
+            snapshot = self.remember(cell, cache.get(self.key(cell)))
+        if snapshot is None:
+            # Nothing to serve yet; wait for the fetcher, shared with any
+            # other request for the same cell
+            future = self.fetcher.request(cell, self.refresh)
+            snapshot = future.result(timeout = settings.CLIMATE_FETCH_WAIT)
+        elif time.time() - snapshot["fetched_at"] > self.cache_timeout:
+            self.fetcher.refresh_later(cell, self.refresh)
+        return snapshot
+
+    def remember(self, cell, snapshot):
+        """
+        Hold a snapshot in this process until it is max_staleness seconds
+        old, counted from when it was fetched, whoever fetched it.
+
+        Returns:
+            dict | None: The snapshot, or None if it is too old to serve
+        """
+        if snapshot is None:
+            return None
+        ttl = self.max_staleness - (time.time() - snapshot["fetched_at"])
+        if ttl <= 0:
+            return None
+        self.snapshots.set(cell, snapshot, ttl = ttl)
+        return snapshot
+
+    @staticmethod
+    def key(cell):
+        lat, lon = cell
+        return f"climate:snapshot:{lat}:{lon}"
+
+    def fetch(self, cell):
+        lat, lon = cell
+        self.limiter.acquire()
+        response = http.session.get(
+             f"{settings.OPENWEATHER_URL}/data/2.5/weather?lat={lat}&lon={lon}&appid={self.api}",
+             timeout = settings.HTTP_TIMEOUT
+        )
+        response.raise_for_status()
+        return response.json()
+
+    def refresh(self, cell):
+        """
+        Fetch a fresh snapshot for a cell, unless another process has.
+
+        While another process holds the cell's fetch lock its stale
+        snapshot is returned, or, when there is none still young enough to
+        serve, the shared cache is polled until the snapshot arrives or the
+        lock is released.
+        """
+        key = self.key(cell)
+        deadline = time.monotonic() + settings.CLIMATE_FETCH_WAIT
+        while True:
+            snapshot = cache.get(key)
+            fresh = snapshot is not None and time.time() - snapshot["fetched_at"] <= self.cache_timeout
+            if fresh and self.remember(cell, snapshot) is not None:
+                return snapshot
+            # The lock expires on its own should its holder die mid-fetch
+            if cache.add(key + ":lock", True, timeout = settings.CLIMATE_FETCH_WAIT):
+                break
+            if self.remember(cell, snapshot) is not None:
+                return snapshot
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Timed out waiting for another process to fetch {cell}")
+            time.sleep(0.1)
+        try:
+            data = self.fetch(cell)
+            body = json.dumps(ClimateModel(**data).as_dict()).encode()
+            snapshot = {
+                "data": data,
+                "fetched_at": time.time(),
+                "body": body,
+                "etag": f'"{hashlib.sha1(body).hexdigest()}"'
+            }
+            cache.set(key, snapshot, self.max_staleness)
+            self.remember(cell, snapshot)
+        finally:
+            cache.delete(key + ":lock")
+        ClimateHistoryModel.objects.record(cell, data)
+        return snapshot
+
 class ClimateModelQueryset(UserList):
     pass
 
@@ -66,3 +200,107 @@ class ClimateModel(models.Model):
         for field in fields:
             result[field.name] = getattr(self, field.name)
         return result
+
+class ClimateHistoryManager(models.Manager):
+
+    # Reading name -> where it sits in an OpenWeather response
+    readings = {
+        "temp": ("main", "temp"),
+        "feels_like": ("main", "feels_like"),
+        "humidity": ("main", "humidity"),
+        "pressure": ("main", "pressure"),
+        "wind_speed": ("wind", "speed"),
+        "clouds": ("clouds", "all"),
+    }
+
+    def record(self, cell, data):
+        """
+        Append the readings from an OpenWeather response for a grid cell.
+
+        Observations are keyed by their upstream timestamp, so fetching the
+        same observation again adds nothing. Failures are logged rather than
+        raised: history must never stop fresh data being served.
+        """
+        lat, lon = cell
+        values = {}
+        for name, (section, key) in self.readings.items():
+            values[name] = (data.get(section) or {}).get(key)
+        try:
+            # Called from the climate fetcher's thread, outside any request
+            close_old_connections()
+            self.bulk_create(
+                [self.model(
+                    lat = lat,
+                    lon = lon,
+                    recorded_at = datetime.fromtimestamp(data["dt"], tz = dt_timezone.utc),
+                    **values
+                )],
+                ignore_conflicts = True
+            )
+        except Exception:
+            logger.warning("Could not record climate history for %s", cell, exc_info = True)
+
+    def downsample(self, cell, start, end, bucket):
+        """
+        Summarise a cell's readings between start and end in buckets of
+        bucket seconds.
+
+        Returns:
+            list: One dict per non-empty bucket, oldest first, holding the bucket
+            start, the number of samples and the min/max/avg of each reading
+        """
+        lat, lon = cell
+        aggregates = {"samples": Count("id")}
+        for name in self.readings:
+            aggregates[f"{name}_min"] = Min(name)
+            aggregates[f"{name}_max"] = Max(name)
+            aggregates[f"{name}_avg"] = Avg(name)
+        rows = self.filter(
+            lat = lat,
+            lon = lon,
+            recorded_at__gte = start,
+            recorded_at__lt = end
+        ).annotate(
+            bucket = RawSQL(
+                "to_timestamp(floor(extract(epoch from recorded_at) / %s) * %s)",
+                (bucket, bucket),
+                output_field = models.DateTimeField()
+            )
+        ).values("bucket").annotate(**aggregates).order_by("bucket")
+        return [
+            {
+                "bucket": row["bucket"].isoformat(),
+                "samples": row["samples"],
+                **{
+                    name: {
+                        "min": row[f"{name}_min"],
+                        "max": row[f"{name}_max"],
+                        "avg": row[f"{name}_avg"],
+                    }
+                    for name in self.readings
+                }
+            }
+            for row in rows
+        ]
+
+class ClimateHistoryModel(models.Model):
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields = ["lat", "lon", "recorded_at"],
+                name = "climate_history_cell_time"
+            )
+        ]
+
+    objects = ClimateHistoryManager()
+
+    lat = models.FloatField()
+    lon = models.FloatField()
+    recorded_at = models.DateTimeField()
+    temp = models.FloatField(null = True)
+    feels_like = models.FloatField(null = True)
+    humidity = models.FloatField(null = True)
+    pressure = models.FloatField(null = True)
+    wind_speed = models.FloatField(null = True)
+    clouds = models.FloatField(null = True)
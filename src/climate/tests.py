@@ -1 +1,99 @@
-# Create your tests here.
+import time
+from concurrent.futures import Future
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase
+
+from climate.models import ClimateModel
+from core.tokens import issue_session_token
+
+
+class SnapTests(SimpleTestCase):
+
+    def test_nearby_locations_share_a_cell(self):
+        grid = ClimateModel.obj.grid
+        self.assertEqual(
+            ClimateModel.obj.snap("41.64", "-80.15"),
+            ClimateModel.obj.snap(str(41.64 + grid / 4), str(-80.15 - grid / 4))
+        )
+
+    def test_coordinates_go_together(self):
+        for lat, lon in (("41.64", None), (None, "-80.15")):
+            with self.subTest(lat = lat, lon = lon):
+                with self.assertRaises(ValueError):
+                    ClimateModel.obj.snap(lat, lon)
+
+    def test_invalid_coordinates(self):
+        for lat, lon in (("91", "0"), ("0", "181"), ("north", "0")):
+            with self.subTest(lat = lat, lon = lon):
+                with self.assertRaises(ValueError):
+                    ClimateModel.obj.snap(lat, lon)
+
+
+class StalenessTests(SimpleTestCase):
+
+    cell = (12.5, 34.5)
+
+    def setUp(self):
+        ClimateModel.obj.snapshots.delete(self.cell)
+
+    def snapshot(self, age):
+        return {"data": {}, "fetched_at": time.time() - age, "body": b"{}", "etag": '"x"'}
+
+    def test_snapshots_past_max_staleness_are_not_served(self):
+        old = self.snapshot(ClimateModel.obj.max_staleness + 1)
+        self.assertIsNone(ClimateModel.obj.remember(self.cell, old))
+        self.assertIsNone(ClimateModel.obj.snapshots.get(self.cell))
+
+    def test_local_copy_expires_with_the_fetch_it_came_from(self):
+        # Copied from another process's fetch nearly max_staleness ago
+        nearly = self.snapshot(ClimateModel.obj.max_staleness - 0.05)
+        self.assertIs(ClimateModel.obj.remember(self.cell, nearly), nearly)
+        time.sleep(0.1)
+        self.assertIsNone(ClimateModel.obj.snapshots.get(self.cell))
+
+    def test_stale_shared_copy_is_refetched(self):
+        cache.set(ClimateModel.obj.key(self.cell), self.snapshot(ClimateModel.obj.max_staleness + 1))
+        fetched = self.snapshot(0)
+        requested = []
+
+        class Fetcher:
+            def request(self, cell, load):
+                requested.append(cell)
+                future = Future()
+                future.set_result(fetched)
+                return future
+
+        try:
+            with mock.patch.object(ClimateModel.obj, "fetcher", Fetcher()):
+                self.assertIs(ClimateModel.obj.get_snapshot(self.cell), fetched)
+        finally:
+            cache.delete(ClimateModel.obj.key(self.cell))
+        self.assertEqual(requested, [self.cell])
+
+
+class ConditionalRequestTests(SimpleTestCase):
+
+    def get(self, if_none_match):
+        snapshot = {"data": {}, "fetched_at": time.time(), "body": b"{}", "etag": '"abc"'}
+        with mock.patch.object(ClimateModel.obj, "get_snapshot", lambda cell: snapshot):
+            return self.client.get(
+                "/v1/climate/",
+                {"lat": "41.64", "lon": "-80.15"},
+                HTTP_USER = "alice",
+                HTTP_X_SESSION_TOKEN = issue_session_token("alice"),
+                HTTP_IF_NONE_MATCH = if_none_match
+            )
+
+    def test_matching_tags_answer_304(self):
+        for tag in ('"abc"', 'W/"abc"', '"other", W/"abc"', "*"):
+            with self.subTest(tag = tag):
+                response = self.get(tag)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response["ETag"], '"abc"')
+
+    def test_other_tags_get_the_body(self):
+        response = self.get('W/"other"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, b"{}")
@@ -1,6 +1,7 @@
 from django.urls import re_path, path
-from .views import ClimateDataViewAll
+from .views import ClimateDataViewAll, ClimateHistoryView
 
 urlpatterns = [
     path('', ClimateDataViewAll.as_view(), name='climate-all'),
+    path('history', ClimateHistoryView.as_view(), name='climate-history'),
 ]
@@ -1,13 +1,19 @@
 import json
+import time
+from datetime import timedelta, timezone as dt_timezone
 
 from rest_framework.generics import ListAPIView, RetrieveAPIView
 from rest_framework.exceptions import APIException
 from rest_framework.response import Response
+from rest_framework.views import APIView
 from django.http import HttpResponse
 from django.core import serializers
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.http import parse_etags
 from rest_framework.permissions import AllowAny
 
-from climate.models import ClimateModel
+from climate.models import ClimateModel, ClimateHistoryModel
 from climate.serializers import ClimateModelSerializer
 
 class ClimateDataViewAll(RetrieveAPIView):
@@ -23,5 +29,98 @@ class ClimateDataViewAll(RetrieveAPIView):
             raise APIException(e) from e
 
     def get(self, request):
-        fields = [obj.as_dict() for obj in self.get_queryset()][-1]
-        return HttpResponse(json.dumps(fields), content_type = "application/json")
+        # The body is encoded once per refresh; clients that already hold it
+        # get a 304, and caches are told to keep it until the next refresh
+        try:
+            cell = ClimateModel.obj.snap(
+                request.GET.get("lat"),
+                request.GET.get("lon")
+            )
+        except (TypeError, ValueError):
+            return HttpResponse(
+                json.dumps({"error": "Give lat and lon together as valid coordinates, or neither"}),
+                status = 400,
+                content_type = "application/json"
+            )
+        try:
+            snapshot = ClimateModel.obj.get_snapshot(cell)
+        except Exception as e:
+            raise APIException(e) from e
+        age = time.time() - snapshot["fetched_at"]
+        max_age = max(0, int(ClimateModel.obj.cache_timeout - age))
+        # If-None-Match compares weakly, so W/ tags match as well
+        if_none_match = [
+            tag.removeprefix("W/")
+            for tag in parse_etags(request.META.get("HTTP_IF_NONE_MATCH", ""))
+        ]
+        if snapshot["etag"] in if_none_match or "*" in if_none_match:
+            response = HttpResponse(status = 304)
+        else:
+            response = HttpResponse(snapshot["body"], content_type = "application/json")
+        response["ETag"] = snapshot["etag"]
+        response["Cache-Control"] = f"max-age={max_age}"
+        return response
+
+class ClimateHistoryView(APIView):
+
+    permission_classes = [AllowAny]
+
+    # Bucket width bounds, in seconds, and the most buckets one query may return
+    min_bucket = 60
+    max_bucket = 86400 * 7
+    max_buckets = 2000
+
+    def get(self, request):
+        """
+        Return min/max/avg readings per bucket for a location and time range.
+
+        Query parameters: lat and lon, given together (default: the
+        configured location), start and end as ISO 8601 datetimes (default:
+        the last 24 hours) and bucket, the bucket width in seconds (default:
+        3600).
+        """
+        try:
+            cell = ClimateModel.obj.snap(
+                request.GET.get("lat"),
+                request.GET.get("lon")
+            )
+            end = self.parse_time(request.GET.get("end")) or timezone.now()
+            start = self.parse_time(request.GET.get("start")) or end - timedelta(days = 1)
+            bucket = int(request.GET.get("bucket", 3600))
+        except (TypeError, ValueError):
+            return self.bad_request("lat, lon, start, end and bucket must be valid")
+        if not self.min_bucket <= bucket <= self.max_bucket:
+            return self.bad_request(f"bucket must be between {self.min_bucket} and {self.max_bucket} seconds")
+        if start >= end:
+            return self.bad_request("start must be before end")
+        if (end - start).total_seconds() / bucket > self.max_buckets:
+            return self.bad_request(f"Range covers more than {self.max_buckets} buckets; widen bucket")
+        history = ClimateHistoryModel.objects.downsample(cell, start, end, bucket)
+        return HttpResponse(
+            json.dumps({
+                "lat": cell[0],
+                "lon": cell[1],
+                "bucket": bucket,
+                "history": history
+            }),
+            content_type = "application/json"
+        )
+
+    @staticmethod
+    def parse_time(value):
+        if value is None:
+            return None
+        parsed = parse_datetime(value)
+        if parsed is None:
+            raise ValueError(value)
+        if timezone.is_naive(parsed):
+            parsed = parsed.replace(tzinfo = dt_timezone.utc)
+        return parsed
+
+    @staticmethod
+    def bad_request(message):
+        return HttpResponse(
+            json.dumps({"error": message}),
+            status = 400,
+            content_type = "application/json"
+        )
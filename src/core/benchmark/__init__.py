@@ -0,0 +1,7 @@
+"""
+Offline load benchmark for the API services.
+
+Used by the benchmark management command: upstreams.py provides local
+stand-ins for GitHub, OpenAI and OpenWeather, and scenarios.py describes
+the requests sent to every route in core/urls.py.
+"""
@@ -0,0 +1,211 @@
+"""
+The requests a benchmark sends, one scenario per route in core/urls.py.
+
+Scenarios are labelled with the same URL names the metrics middleware
+uses, so timings measured here can be matched with the query counts the
+server reports for the route.
+"""
+
+from inventory.models import Inventory, InventoryBlob
+from omnipresence.models import OmnipresenceModel
+from persona.models import PersonaModel, PersonaThreadModel
+
+PERSONA = "bench-persona"
+ITEM_BINARY = b"\x08" * 256
+
+
+class World:
+    """
+    Primary keys and names of the rows seeded for a benchmark run.
+    """
+
+    def __init__(self, charnames, character_ids):
+        self.charnames = charnames
+        self.character_ids = character_ids
+
+    def charname(self, i):
+        return self.charnames[i % len(self.charnames)]
+
+    def character_id(self, i):
+        return self.character_ids[i % len(self.character_ids)]
+
+
+def seed(characters, requests):
+    """
+    Populate the (empty) benchmark database.
+
+    Items weigh nothing so that no amount of adding or transferring ever
+    trips the overburden trigger, and quantities are large enough that no
+    run can use them up.
+
+    Args:
+        characters: The number of characters to create
+        requests: Requests per route; one deletable thread is made for each
+
+    Returns:
+        World: What was created
+    """
+    records = OmnipresenceModel.objects.bulk_create([
+        OmnipresenceModel(
+            username = "bench",
+            charname = f"bench-{i}",
+            working_dir = f"/world/room-{i % 10}"
+        )
+        for i in range(characters)
+    ])
+    digest, = InventoryBlob.objects.ingest(ITEM_BINARY)
+    items = []
+    for record in records:
+        items.append(Inventory(
+            item_owner = record, item_name = "stone", item_qty = 1e9,
+            item_weight = 0.0, item_bulk = 0.0, item_blob_id = digest
+        ))
+        items.append(Inventory(
+            item_owner = record, item_name = "potion", item_qty = 1e9,
+            item_weight = 0.0, item_bulk = 0.0, item_consumable = True,
+            item_blob_id = digest
+        ))
+    Inventory.objects.bulk_create(items)
+    PersonaModel.objects.create(
+        assistant_name = PERSONA,
+        assistant_id = "asst_bench",
+        assistant_owner = records[0]
+    )
+    # Threads to delete belong to a persona nobody talks to, so that the
+    # generate scenario's get_or_create still finds at most one thread
+    retired = PersonaModel.objects.create(
+        assistant_name = f"{PERSONA}-retired",
+        assistant_id = "asst_retired",
+        assistant_owner = records[0]
+    )
+    PersonaThreadModel.objects.bulk_create([
+        PersonaThreadModel(
+            thread_owner = records[0],
+            assistant_id = retired,
+            thread_id = f"thread_delete{i}"
+        )
+        for i in range(requests)
+    ])
+    return World(
+        [record.charname for record in records],
+        [record.pk for record in records]
+    )
+
+
+class Scenario:
+    """
+    A route and a recipe for the i-th request sent to it.
+
+    build(i, world) returns the keyword arguments for requests.request,
+    with a path in place of the URL.
+    """
+
+    def __init__(self, route, method, build):
+        self.route = route
+        self.method = method
+        self.build = build
+
+
+SCENARIOS = [
+    Scenario("climate:climate-all", "GET", lambda i, w: {
+        "path": "/v1/climate/"
+    }),
+    Scenario("climate:climate-history", "GET", lambda i, w: {
+        "path": "/v1/climate/history",
+        "params": {"bucket": 3600}
+    }),
+    Scenario("inventory:inventory-list", "GET", lambda i, w: {
+        "path": "/v1/inventory/list",
+        "params": {"charname": w.charname(i)}
+    }),
+    Scenario("inventory:inventory-list", "GET", lambda i, w: {
+        "path": "/v1/inventory/list",
+        "params": {"charname": w.charname(i), "binaries": "false"}
+    }),
+    Scenario("inventory:inventory-binary", "GET", lambda i, w: {
+        "path": "/v1/inventory/binary",
+        "params": {"charname": w.charname(i), "item_name": "stone"}
+    }),
+    Scenario("inventory:inventory-capacity", "GET", lambda i, w: {
+        "path": "/v1/inventory/capacity",
+        "params": {"charname": w.charname(i)}
+    }),
+    Scenario("inventory:inventory-search", "POST", lambda i, w: {
+        "path": "/v1/inventory/search/",
+        "data": {"charname": w.charname(i), "item_name": "stone"}
+    }),
+    Scenario("inventory:inventory-add", "POST", lambda i, w: {
+        "path": "/v1/inventory/add/",
+        "data": {
+            "item_owner": w.charname(i), "item_name": "pebble",
+            "item_qty": 1, "item_consumable": False
+        },
+        "files": {"item_binary": ("pebble", ITEM_BINARY)}
+    }),
+    Scenario("inventory:inventory-add-bulk", "POST", lambda i, w: {
+        "path": "/v1/inventory/add/bulk",
+        "json": {"items": [
+            {
+                "item_owner": w.charname(i + j), "item_name": "stone",
+                "item_qty": 1, "item_binary": ITEM_BINARY.hex()
+            }
+            for j in range(10)
+        ]}
+    }),
+    Scenario("inventory:inventory-reduce", "PATCH", lambda i, w: {
+        "path": "/v1/inventory/reduce/",
+        "data": {"item_owner": w.charname(i), "item_name": "potion"}
+    }),
+    Scenario("inventory:inventory-transfer", "PATCH", lambda i, w: {
+        "path": f"/v1/inventory/transfer/{w.charname(i + 1)}",
+        "data": {"charname": w.charname(i), "item_name": "stone"}
+    }),
+    Scenario("omnipresence:omnipresence", "GET", lambda i, w: {
+        "path": "/v1/omnipresence/",
+        "params": {"charname": w.charname(i)}
+    }),
+    Scenario("omnipresence:omnipresence", "POST", lambda i, w: {
+        "path": "/v1/omnipresence/",
+        "data": {"username": "bench", "charname": f"bench-new-{i}", "working_dir": "/world"}
+    }),
+    Scenario("omnipresence:omnipresence-update", "PATCH", lambda i, w: {
+        "path": f"/v1/omnipresence/update/{w.character_id(i)}/",
+        "data": {"working_dir": f"/world/room-{i % 10}"}
+    }),
+    Scenario("omnipresence:omnipresence-heartbeat", "POST", lambda i, w: {
+        "path": f"/v1/omnipresence/heartbeat/{w.character_id(i)}/"
+    }),
+    Scenario("omnipresence:omnipresence-active", "GET", lambda i, w: {
+        "path": "/v1/omnipresence/active/"
+    }),
+    Scenario("omnipresence:omnipresence-active", "GET", lambda i, w: {
+        "path": "/v1/omnipresence/active/",
+        "params": {"limit": 20, "fields": "pk,charname,working_dir"}
+    }),
+    Scenario("omnipresence:omnipresence-local", "POST", lambda i, w: {
+        "path": "/v1/omnipresence/local/",
+        "data": {"cwd": f"/world/room-{i % 10}"}
+    }),
+    Scenario("omnipresence:omnipresence-local", "POST", lambda i, w: {
+        "path": "/v1/omnipresence/local/",
+        "data": {"cwd": "/world", "subtree": True}
+    }),
+    Scenario("persona:persona-search", "GET", lambda i, w: {
+        "path": f"/v1/persona/search/{PERSONA}"
+    }),
+    Scenario("persona:persona-generate", "POST", lambda i, w: {
+        "path": f"/v1/persona/generate/{PERSONA}",
+        "data": {"charname": w.charname(i), "message": "Hello!"}
+    }),
+    Scenario("persona:persona-create", "POST", lambda i, w: {
+        "path": f"/v1/persona/create/{PERSONA}-{i}",
+        "data": {"persona_creator": w.charname(0), "persona_prompt": "Be brief."},
+        "files": {"file_binary": ("persona.txt", b"")}
+    }),
+    Scenario("persona:persona-thread-cancel", "GET", lambda i, w: {
+        "path": "/v1/persona/cancel/thread_bench"
+    }),
+    Scenario("persona:persona-thread-delete", "DELETE", lambda i, w: {
+        "path": f"/v1/persona/delete/thread_delete{i}"
+    }),
+]
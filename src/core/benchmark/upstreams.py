@@ -0,0 +1,211 @@
+"""
+Local stand-ins for the third-party services the API calls.
+
+Each server answers the handful of endpoints the API actually uses with
+fixed, valid-looking payloads, so a benchmark measures this server rather
+than the internet. They run on ephemeral ports in daemon threads.
+"""
+
+import itertools
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+WEATHER = {
+    "coord": {"lon": -80.15, "lat": 41.64},
+    "weather": [{"id": 800, "main": "Clear", "description": "clear sky", "icon": "01d"}],
+    "base": "stations",
+    "main": {
+        "temp": 285.4, "feels_like": 284.3, "temp_min": 284.8, "temp_max": 286.1,
+        "pressure": 1017, "humidity": 62
+    },
+    "visibility": 10000,
+    "wind": {"speed": 3.6, "deg": 250},
+    "rain": {},
+    "clouds": {"all": 0},
+    "dt": 1700000000,
+    "sys": {"country": "US", "sunrise": 1699960000, "sunset": 1699996000},
+    "timezone": -18000,
+    "id": 5188843,
+    "name": "Meadville",
+    "cod": 200
+}
+
+
+class _Handler(BaseHTTPRequestHandler):
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, payload, status = 200):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+
+class GitHubHandler(_Handler):
+    """
+    GET /user, treating the last word of the Authorization header as the login.
+    """
+
+    def do_GET(self):
+        token = self.headers.get("Authorization") or ""
+        if self.path != "/user" or not token:
+            return self.send_json({"message": "Bad credentials"}, status = 401)
+        self.send_json({"login": token.split()[-1], "id": 1})
+
+
+class OpenWeatherHandler(_Handler):
+    """
+    GET /data/2.5/weather, always the same clear day.
+    """
+
+    def do_GET(self):
+        if not self.path.startswith("/data/2.5/weather"):
+            return self.send_json({"cod": 404}, status = 404)
+        self.send_json(WEATHER)
+
+
+class OpenAIHandler(_Handler):
+    """
+    The assistants, threads, runs and vector store calls made in persona/views.py.
+
+    Runs complete immediately and never request tool calls.
+    """
+
+    ids = itertools.count()
+
+    def new_id(self, prefix):
+        return f"{prefix}_bench{next(self.ids)}"
+
+    def run(self, thread_id, run_id = None):
+        return {
+            "id": run_id or self.new_id("run"),
+            "object": "thread.run",
+            "created_at": int(time.time()),
+            "thread_id": thread_id,
+            "assistant_id": "asst_bench",
+            "status": "completed",
+            "required_action": None,
+            "instructions": "",
+            "model": "gpt-4o",
+            "tools": [],
+            "parallel_tool_calls": False
+        }
+
+    def message(self, thread_id, text = "Hello from the benchmark."):
+        return {
+            "id": self.new_id("msg"),
+            "object": "thread.message",
+            "created_at": int(time.time()),
+            "thread_id": thread_id,
+            "role": "assistant",
+            "status": "completed",
+            "attachments": [],
+            "metadata": {},
+            "content": [
+                {"type": "text", "text": {"value": text, "annotations": []}}
+            ]
+        }
+
+    def page(self, data):
+        return {"object": "list", "data": data, "has_more": False}
+
+    def do_POST(self):
+        body = self.read_body()
+        path = self.path.split("?")[0]
+        if path == "/v1/threads":
+            return self.send_json({
+                "id": self.new_id("thread"), "object": "thread",
+                "created_at": int(time.time()), "metadata": {}
+            })
+        if match := re.fullmatch(r"/v1/threads/([^/]+)/messages", path):
+            return self.send_json(self.message(match[1]))
+        if match := re.fullmatch(r"/v1/threads/([^/]+)/runs/([^/]+)/(cancel|submit_tool_outputs)", path):
+            return self.send_json(self.run(match[1], match[2]))
+        if match := re.fullmatch(r"/v1/threads/([^/]+)/runs", path):
+            return self.send_json(self.run(match[1]))
+        if path == "/v1/vector_stores":
+            return self.send_json({
+                "id": self.new_id("vs"), "object": "vector_store",
+                "created_at": int(time.time()), "name": "Inventory", "status": "completed",
+                "file_counts": {"in_progress": 0, "completed": 0, "failed": 0, "cancelled": 0, "total": 0},
+                "usage_bytes": 0
+            })
+        if path == "/v1/assistants":
+            return self.send_json({
+                "id": self.new_id("asst"), "object": "assistant",
+                "created_at": int(time.time()), "name": json.loads(body or b"{}").get("name"),
+                "model": "gpt-4o", "instructions": "", "tools": []
+            })
+        self.send_json({"error": {"message": f"Unknown endpoint {path}"}}, status = 404)
+
+    def do_GET(self):
+        path, _, query = self.path.partition("?")
+        if "after=" in query:
+            # Every listing fits on its first page
+            return self.send_json(self.page([]))
+        if match := re.fullmatch(r"/v1/threads/([^/]+)/runs/([^/]+)", path):
+            return self.send_json(self.run(match[1], match[2]))
+        if match := re.fullmatch(r"/v1/threads/([^/]+)/runs", path):
+            return self.send_json(self.page([self.run(match[1])]))
+        if match := re.fullmatch(r"/v1/threads/([^/]+)/messages", path):
+            return self.send_json(self.page([self.message(match[1])]))
+        self.send_json({"error": {"message": f"Unknown endpoint {path}"}}, status = 404)
+
+
+class Upstreams:
+    """
+    Starts the three stand-in services and exposes their base URLs.
+    """
+
+    handlers = {
+        "github": GitHubHandler,
+        "openweather": OpenWeatherHandler,
+        "openai": OpenAIHandler
+    }
+
+    def __init__(self, host = "127.0.0.1"):
+        self.host = host
+        self.servers = {}
+
+    def __enter__(self):
+        for name, handler in self.handlers.items():
+            server = ThreadingHTTPServer((self.host, 0), handler)
+            server.daemon_threads = True
+            threading.Thread(target = server.serve_forever, daemon = True).start()
+            self.servers[name] = server
+        return self
+
+    def __exit__(self, *exc_info):
+        for server in self.servers.values():
+            server.shutdown()
+            server.server_close()
+
+    def url(self, name):
+        return f"http://{self.host}:{self.servers[name].server_port}"
+
+    def environ(self):
+        """
+        Environment variables pointing the API at these stand-ins.
+        """
+        return {
+            "GITHUB_API_URL": self.url("github"),
+            "OPENWEATHER_URL": self.url("openweather"),
+            "OPENWEATHER_API": "bench",
+            "OPENWEATHER_LAT": str(WEATHER["coord"]["lat"]),
+            "OPENWEATHER_LON": str(WEATHER["coord"]["lon"]),
+            "OPEN_AI_URL": f"{self.url('openai')}/v1",
+            "OPEN_AI_KEY": "bench"
+        }
@@ -0,0 +1,111 @@
+"""
+Shared HTTP clients for calls from the API to upstream services.
+
+Both clients keep connections alive between requests, so talking to the
+same host again skips the TCP and TLS handshakes, and both apply the
+HTTP_TIMEOUT setting so a slow upstream cannot hold a worker indefinitely.
+Every call made through them is timed per host in core.metrics.
+"""
+
+import asyncio
+import time
+import weakref
+from urllib.parse import urlsplit
+
+import httpx
+import requests
+from django.conf import settings
+
+from core import metrics
+
+
+class TimedSession(requests.Session):
+    """
+    A requests session that reports the duration of each call by host.
+    """
+
+    def request(self, method, url, *args, **kwargs):
+        host = urlsplit(url).hostname
+        start = time.perf_counter()
+        try:
+            response = super().request(method, url, *args, **kwargs)
+        except requests.RequestException:
+            metrics.observe_outbound(host, "error", time.perf_counter() - start)
+            raise
+        metrics.observe_outbound(host, response.status_code, time.perf_counter() - start)
+        return response
+
+
+class TimedTransport(httpx.HTTPTransport):
+    """
+    An httpx transport that reports the duration of each call by host.
+    """
+
+    def handle_request(self, request):
+        start = time.perf_counter()
+        try:
+            response = super().handle_request(request)
+        except httpx.HTTPError:
+            metrics.observe_outbound(request.url.host, "error", time.perf_counter() - start)
+            raise
+        metrics.observe_outbound(request.url.host, response.status_code, time.perf_counter() - start)
+        return response
+
+
+class TimedAsyncTransport(httpx.AsyncHTTPTransport):
+    """
+    Asynchronous counterpart of TimedTransport.
+    """
+
+    async def handle_async_request(self, request):
+        start = time.perf_counter()
+        try:
+            response = await super().handle_async_request(request)
+        except httpx.HTTPError:
+            metrics.observe_outbound(request.url.host, "error", time.perf_counter() - start)
+            raise
+        metrics.observe_outbound(request.url.host, response.status_code, time.perf_counter() - start)
+        return response
+
+
+session = TimedSession()
+session.mount(
+    "https://",
+    requests.adapters.HTTPAdapter(
+        pool_connections = settings.HTTP_POOL_SIZE,
+        pool_maxsize = settings.HTTP_POOL_SIZE
+    )
+)
+session.mount(
+    "http://",
+    requests.adapters.HTTPAdapter(
+        pool_connections = settings.HTTP_POOL_SIZE,
+        pool_maxsize = settings.HTTP_POOL_SIZE
+    )
+)
+
+# httpx clients are bound to the event loop that first uses them
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def get_async_client():
+    """
+    Return the pooled async client for the running event loop.
+
+    Returns:
+        httpx.AsyncClient: A client created on first use in each loop
+    """
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = httpx.AsyncClient(
+            timeout = settings.HTTP_TIMEOUT,
+            transport = TimedAsyncTransport(
+                limits = httpx.Limits(
+                    max_connections = settings.HTTP_POOL_SIZE,
+                    max_keepalive_connections = settings.HTTP_POOL_SIZE
+                )
+            )
+        )
+        _async_clients[loop] = client
+    return client
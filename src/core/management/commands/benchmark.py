@@ -0,0 +1,208 @@
+import json
+import math
+import os
+import re
+import secrets
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import requests
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from core.benchmark.scenarios import SCENARIOS, seed
+from core.benchmark.upstreams import Upstreams
+
+QUERY_METRIC = re.compile(
+    r'^whorl_db_queries_per_request_(sum|count)\{route="([^"]*)"\} (\S+)$',
+    re.MULTILINE
+)
+
+
+def percentile(ordered, p):
+    if not ordered:
+        return 0.0
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+class Command(BaseCommand):
+
+    help = (
+        "Load-test every API route against local stand-ins for GitHub, OpenAI "
+        "and OpenWeather, using a freshly created and seeded test database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type = int, default = 200, help = "Requests per route")
+        parser.add_argument("--concurrency", type = int, default = 8, help = "Requests in flight at once")
+        parser.add_argument("--warmup", type = int, default = 10, help = "Unmeasured requests per route")
+        parser.add_argument("--characters", type = int, default = 50, help = "Characters to seed")
+        parser.add_argument("--server", choices = ["wsgi", "asgi"], default = "wsgi")
+        parser.add_argument("--port", type = int, default = 8765)
+        parser.add_argument("--route", action = "append", help = "Only run routes containing this text")
+        parser.add_argument("--output", help = "Also write the results as JSON to this file")
+
+    def handle(self, *args, **options):
+        scenarios = [
+            scenario for scenario in SCENARIOS
+            if not options["route"] or any(text in scenario.route for text in options["route"])
+        ]
+        if not scenarios:
+            raise CommandError("No routes match --route")
+
+        old_name = connection.settings_dict["NAME"]
+        test_name = connection.creation.create_test_db(
+            verbosity = 0, autoclobber = True, serialize = False
+        )
+        try:
+            world = seed(options["characters"], options["requests"] + options["warmup"])
+            connection.close()
+            with Upstreams() as upstreams:
+                with self.serve(options["server"], options["port"], test_name, upstreams) as base_url:
+                    results = [
+                        self.drive(base_url, scenario, world, options)
+                        for scenario in scenarios
+                    ]
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity = 0)
+
+        self.report(results)
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                json.dump(results, output, indent = 2)
+
+    @contextmanager
+    def serve(self, server, port, database, upstreams):
+        """
+        Run the API in a child process wired to the benchmark database and stand-ins.
+        """
+        self.metrics_token = secrets.token_urlsafe(32)
+        if server == "asgi":
+            command = [
+                sys.executable, "-m", "uvicorn", "core.asgi:application",
+                "--port", str(port), "--log-level", "warning"
+            ]
+        else:
+            command = [
+                sys.executable, "manage.py", "runserver", f"127.0.0.1:{port}", "--noreload"
+            ]
+        environ = {
+            **os.environ,
+            **upstreams.environ(),
+            "API_DB_NAME": database,
+            "SESSION_TOKEN_SECRET": secrets.token_urlsafe(32),
+            # The metrics endpoint stays closed without one
+            "METRICS_TOKEN": self.metrics_token
+        }
+        process = subprocess.Popen(
+            command,
+            cwd = settings.BASE_DIR,
+            env = environ,
+            stdout = subprocess.DEVNULL,
+            stderr = subprocess.DEVNULL
+        )
+        base_url = f"http://127.0.0.1:{port}"
+        try:
+            deadline = time.monotonic() + 30
+            while True:
+                if process.poll() is not None:
+                    raise CommandError(f"The {server} server exited during startup")
+                try:
+                    requests.get(f"{base_url}/v1/metrics", timeout = 1)
+                    break
+                except requests.ConnectionError:
+                    if time.monotonic() > deadline:
+                        raise CommandError(f"The {server} server did not start")
+                    time.sleep(0.2)
+            yield base_url
+        finally:
+            process.terminate()
+            process.wait()
+
+    def drive(self, base_url, scenario, world, options):
+        """
+        Send one route's warm-up and measured requests and summarise them.
+        """
+        local = threading.local()
+
+        def send(i):
+            # One keep-alive session per worker thread, each its own user,
+            # carrying the session token the server hands back like a client would
+            if not hasattr(local, "session"):
+                local.session = requests.Session()
+                user = f"bench-user-{threading.get_ident()}"
+                local.session.headers.update({"Authorization": f"token {user}", "User": user})
+            kwargs = scenario.build(i, world)
+            url = base_url + kwargs.pop("path")
+            start = time.perf_counter()
+            response = local.session.request(scenario.method, url, **kwargs)
+            elapsed = time.perf_counter() - start
+            if "X-Session-Token" in response.headers:
+                local.session.headers["X-Session-Token"] = response.headers["X-Session-Token"]
+            return elapsed, response.status_code
+
+        warmup, total = options["warmup"], options["requests"]
+        with ThreadPoolExecutor(options["concurrency"]) as pool:
+            list(pool.map(send, range(warmup)))
+            before = self.query_totals(base_url)
+            start = time.perf_counter()
+            samples = list(pool.map(send, range(warmup, warmup + total)))
+            wall = time.perf_counter() - start
+        after = self.query_totals(base_url)
+
+        latencies = sorted(elapsed for elapsed, _ in samples)
+        queries, counted = (
+            after.get(scenario.route, (0, 0))[i] - before.get(scenario.route, (0, 0))[i]
+            for i in range(2)
+        )
+        return {
+            "route": scenario.route,
+            "method": scenario.method,
+            "requests": total,
+            "errors": sum(1 for _, status in samples if status >= 400),
+            "p50_ms": percentile(latencies, 50) * 1000,
+            "p95_ms": percentile(latencies, 95) * 1000,
+            "p99_ms": percentile(latencies, 99) * 1000,
+            "throughput": total / wall if wall else 0.0,
+            "queries_per_request": queries / counted if counted else None
+        }
+
+    def query_totals(self, base_url):
+        """
+        Read the server's cumulative (query sum, request count) per route.
+        """
+        response = requests.get(
+            f"{base_url}/v1/metrics",
+            headers = {"Authorization": f"Bearer {self.metrics_token}"}
+        )
+        response.raise_for_status()
+        text = response.text
+        totals = {}
+        for kind, route, value in QUERY_METRIC.findall(text):
+            queries, count = totals.get(route, (0.0, 0.0))
+            if kind == "sum":
+                queries = float(value)
+            else:
+                count = float(value)
+            totals[route] = (queries, count)
+        return totals
+
+    def report(self, results):
+        header = (
+            f"{'route':<36} {'method':<7} {'errors':>6} {'p50 ms':>8} "
+            f"{'p95 ms':>8} {'p99 ms':>8} {'req/s':>8} {'queries':>8}"
+        )
+        self.stdout.write(header)
+        self.stdout.write("-" * len(header))
+        for result in results:
+            queries = result["queries_per_request"]
+            self.stdout.write(
+                f"{result['route']:<36} {result['method']:<7} {result['errors']:>6} "
+                f"{result['p50_ms']:>8.1f} {result['p95_ms']:>8.1f} {result['p99_ms']:>8.1f} "
+                f"{result['throughput']:>8.1f} {'-' if queries is None else f'{queries:.1f}':>8}"
+            )
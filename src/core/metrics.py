@@ -0,0 +1,232 @@
+"""
+Request instrumentation exposed in the Prometheus text format.
+
+MetricsMiddleware times every request and labels it with the name of the
+URL pattern it resolved to. Database queries and outbound HTTP calls made
+while serving a request are attributed to it through a context variable,
+which follows the request into the threads Django uses for sync code under
+ASGI. Metrics are kept per process; each worker reports its own.
+"""
+
+import contextvars
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.db.backends.signals import connection_created
+from django.urls import Resolver404, resolve
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+# Any other method a client sends is labelled "other", so clients cannot
+# add series without bound
+METHODS = frozenset(("GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"))
+
+
+class Histogram:
+    """
+    A labelled, thread-safe histogram rendered as a Prometheus histogram.
+    """
+
+    def __init__(self, name, documentation, labelnames, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                # One slot per bucket, plus the running sum and count
+                series = self._series[labels] = [0] * len(self.buckets) + [0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} histogram",
+        ]
+        with self._lock:
+            series = {labels: list(values) for labels, values in self._series.items()}
+        for labels, values in sorted(series.items()):
+            pairs = [
+                f'{name}="{_escape(value)}"'
+                for name, value in zip(self.labelnames, labels)
+            ]
+            for bound, count in zip(self.buckets, values):
+                bucket = ",".join(pairs + [f'le="{bound}"'])
+                lines.append(f"{self.name}_bucket{{{bucket}}} {count}")
+            bucket = ",".join(pairs + ['le="+Inf"'])
+            lines.append(f"{self.name}_bucket{{{bucket}}} {values[-1]}")
+            label_text = "{" + ",".join(pairs) + "}" if pairs else ""
+            lines.append(f"{self.name}_sum{label_text} {values[-2]}")
+            lines.append(f"{self.name}_count{label_text} {values[-1]}")
+        return "\n".join(lines)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+REQUEST_LATENCY = Histogram(
+    "whorl_http_request_duration_seconds",
+    "Time spent serving a request, including authentication.",
+    ("route", "method", "status"),
+    LATENCY_BUCKETS
+)
+RESPONSE_SIZE = Histogram(
+    "whorl_http_response_size_bytes",
+    "Size of response bodies.",
+    ("route",),
+    SIZE_BUCKETS
+)
+DB_QUERIES = Histogram(
+    "whorl_db_queries_per_request",
+    "Number of database queries issued while serving a request.",
+    ("route",),
+    QUERY_COUNT_BUCKETS
+)
+DB_TIME = Histogram(
+    "whorl_db_query_duration_seconds",
+    "Total time spent in database queries while serving a request.",
+    ("route",),
+    LATENCY_BUCKETS
+)
+OUTBOUND_LATENCY = Histogram(
+    "whorl_outbound_request_duration_seconds",
+    "Time spent on HTTP calls to upstream services, by host.",
+    ("host", "status"),
+    LATENCY_BUCKETS
+)
+
+REGISTRY = (REQUEST_LATENCY, RESPONSE_SIZE, DB_QUERIES, DB_TIME, OUTBOUND_LATENCY)
+
+
+def render():
+    """
+    Return every metric in the Prometheus text exposition format.
+    """
+    return "\n".join(metric.render() for metric in REGISTRY) + "\n"
+
+
+class RequestStats:
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+
+
+_request_stats = contextvars.ContextVar("request_stats", default=None)
+
+
+def time_query(execute, sql, params, many, context):
+    """
+    Database execute wrapper charging each query to the current request.
+    """
+    stats = _request_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.db_time += time.perf_counter() - start
+
+
+def instrument_connection(sender, connection, **kwargs):
+    if time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(time_query)
+
+
+connection_created.connect(instrument_connection)
+
+
+def observe_outbound(host, status, seconds):
+    """
+    Record one HTTP call to an upstream host; status is "error" on failure.
+    """
+    OUTBOUND_LATENCY.observe(seconds, host or "unknown", str(status))
+
+
+def route_name(request):
+    """
+    Label a request with its URL name, e.g. "inventory:inventory-add".
+
+    Requests rejected before URL resolution (by authentication, for
+    instance) are resolved here so they are still labelled by route.
+    """
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        try:
+            match = resolve(request.path_info)
+        except Resolver404:
+            return "unmatched"
+    return match.view_name
+
+
+class MetricsMiddleware:
+    """
+    Middleware recording latency, size and database load for each request.
+
+    It should be the first entry in MIDDLEWARE so that the time spent in
+    every other middleware, authentication included, is measured.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(self.get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        stats = RequestStats()
+        reset = _request_stats.set(stats)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_stats.reset(reset)
+        self.record(request, response, stats, time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        stats = RequestStats()
+        reset = _request_stats.set(stats)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_stats.reset(reset)
+        self.record(request, response, stats, time.perf_counter() - start)
+        return response
+
+    @staticmethod
+    def record(request, response, stats, seconds):
+        route = route_name(request)
+        method = request.method if request.method in METHODS else "other"
+        REQUEST_LATENCY.observe(seconds, route, method, str(response.status_code))
+        DB_QUERIES.observe(stats.queries, route)
+        DB_TIME.observe(stats.db_time, route)
+        if response.streaming:
+            # Streamed bodies have not been produced yet; only trust a declared length
+            size = response.get("Content-Length")
+            if size is None:
+                return
+            size = int(size)
+        else:
+            size = len(response.content)
+        RESPONSE_SIZE.observe(size, route)
@@ -5,11 +5,89 @@ This module provides middleware to authenticate incoming requests
 using GitHub tokens. It validates that the provided token belongs
 to the user making the request by comparing the GitHub username
 from the token with the username provided in the request headers.
+Outcomes of recent checks are cached so that repeat requests carrying the
+same token do not each make a round trip to GitHub, and concurrent checks
+of the same token share a single outbound call. After a successful check
+the client is issued a signed session token (see core.tokens) which, while
+it is valid, lets later requests skip GitHub altogether.
+
+The middleware runs natively under both WSGI and ASGI; in async mode the
+GitHub check is awaited on a pooled async client instead of blocking a
+thread per request.
 """
 
+import asyncio
+import hashlib
+
+import httpx
 import requests
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
 from django.http import JsonResponse
 
+from core import http
+from core.cache import SingleFlight, TTLCache
+from core.tokens import issue_session_token, verify_session_token
+
+SESSION_TOKEN_HEADER = "X-Session-Token"
+
+
+class TokenVerificationCache:
+    """
+    Remembers the outcome of recent GitHub token checks.
+
+    Entries are keyed by a digest of the token and the claimed user, so raw
+    tokens are never kept once a request has finished. Confirmed and rejected
+    pairs are held in separate caches so that rejections can expire quickly
+    without shortening how long a good token is trusted.
+    """
+
+    def __init__(self, maxsize, ttl, negative_ttl):
+        """
+        Args:
+            maxsize: The maximum number of entries in each of the two caches
+            ttl: Seconds a confirmed token/user pair is trusted
+            negative_ttl: Seconds a rejected token/user pair stays rejected
+        """
+        self.positive = TTLCache(maxsize, ttl)
+        self.negative = TTLCache(maxsize, negative_ttl)
+
+    @staticmethod
+    def key(token, user):
+        """
+        Derive the cache key for a token and the user it claims to belong to.
+        """
+        return hashlib.sha256(f"{token}\0{user}".encode()).hexdigest()
+
+    def lookup(self, key):
+        """
+        Return True or False for a cached outcome, or None if nothing is cached.
+        """
+        if self.positive.get(key):
+            return True
+        if self.negative.get(key):
+            return False
+        return None
+
+    def remember(self, key, verified):
+        """
+        Record the outcome of a GitHub check, replacing any opposite entry.
+        """
+        if verified:
+            self.negative.delete(key)
+            self.positive.set(key, True)
+        else:
+            self.positive.delete(key)
+            self.negative.set(key, True)
+
+    def evict(self, token, user):
+        """
+        Forget any cached outcome for the token/user pair, e.g. after revocation.
+        """
+        key = self.key(token, user)
+        self.positive.delete(key)
+        self.negative.delete(key)
+
 
 class GitHubTokenAuthenticationMiddleware:
     """
@@ -21,6 +99,9 @@ class GitHubTokenAuthenticationMiddleware:
     user specified in the HTTP_USER header.
     """
 
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
         """
         Initialize the middleware with the given response handler.
@@ -29,14 +110,28 @@ class GitHubTokenAuthenticationMiddleware:
             get_response: The next middleware or view in the Django request/response chain
         """
         self.get_response = get_response
+        self.verifications = TokenVerificationCache(
+            maxsize = settings.GITHUB_AUTH_CACHE_SIZE,
+            ttl = settings.GITHUB_AUTH_CACHE_TTL,
+            negative_ttl = settings.GITHUB_AUTH_NEGATIVE_CACHE_TTL
+        )
+        self.inflight = SingleFlight()
+        self.async_inflight = {}
+        self.async_mode = iscoroutinefunction(self.get_response)
+        if self.async_mode:
+            # Let Django's handler await this middleware directly
+            markcoroutinefunction(self)
 
     def __call__(self, request):
         """
         Process the incoming request and authenticate the GitHub token.
         
         This method extracts the GitHub token from the request headers,
-        validates it against the GitHub API, and ensures the token belongs
-        to the specified user. If authentication succeeds, the request is
+        validates it against the GitHub API (or a cached earlier answer),
+        and ensures the token belongs to the specified user. A valid session
+        token for the user, sent in the X-Session-Token header, is accepted
+        in place of this check; a fresh one is returned in the same header
+        whenever GitHub had to be consulted. If authentication succeeds, the request is
         passed to the next handler; otherwise, a 403 Forbidden response is returned.
         
         Args:
@@ -46,24 +141,172 @@ class GitHubTokenAuthenticationMiddleware:
             HttpResponse: Either the response from the next handler if authentication
             succeeds, or a 403 Forbidden JsonResponse if it fails
         """
+        if self.async_mode:
+            return self.__acall__(request)
+
+        if request.path_info in settings.GITHUB_AUTH_EXEMPT_PATHS:
+            return self.get_response(request)
+
+        token, http_user, session_token = self.read_credentials(request)
+
+        if http_user and session_token and verify_session_token(session_token, http_user):
+            # Signed by this server for this user; no need to ask GitHub again
+            return self.get_response(request)
+
+        if not token or not http_user:
+            return self.forbidden()
+
+        key = self.verifications.key(token, http_user)
+        verified = self.verifications.lookup(key)
+        if verified is None:
+            # Requests arriving together with the same token wait on one check
+            verified = self.inflight.do(key, self.check_token, key, token, http_user)
+
+        if verified:
+            # User is authenticated
+            response = self.get_response(request)
+            response[SESSION_TOKEN_HEADER] = issue_session_token(http_user)
+            return response
+        # User is not authenticated
+        return self.forbidden()
+
+    async def __acall__(self, request):
+        """
+        Asynchronous counterpart of __call__, used when served over ASGI.
+        """
+        if request.path_info in settings.GITHUB_AUTH_EXEMPT_PATHS:
+            return await self.get_response(request)
+
+        token, http_user, session_token = self.read_credentials(request)
+
+        if http_user and session_token and verify_session_token(session_token, http_user):
+            return await self.get_response(request)
+
+        if not token or not http_user:
+            return self.forbidden()
+
+        key = self.verifications.key(token, http_user)
+        verified = self.verifications.lookup(key)
+        if verified is None:
+            verified = await self.acoalesce_check(key, token, http_user)
+
+        if verified:
+            response = await self.get_response(request)
+            response[SESSION_TOKEN_HEADER] = issue_session_token(http_user)
+            return response
+        return self.forbidden()
+
+    @staticmethod
+    def read_credentials(request):
+        """
+        Pull the GitHub token, claimed user and session token from the headers.
+        """
         headers = request.META
-        token = headers.get("HTTP_AUTHORIZATION")
-        http_user = headers.get("HTTP_USER")
+        return (
+            headers.get("HTTP_AUTHORIZATION"),
+            headers.get("HTTP_USER"),
+            headers.get("HTTP_X_SESSION_TOKEN")
+        )
+
+    @staticmethod
+    def forbidden():
+        return JsonResponse({"detail": "Forbidden"}, status=403)
+
+    def check_token(self, key, token, http_user):
+        """
+        Resolve a cache miss by asking GitHub and caching a definitive answer.
+
+        The cache is consulted again first: a check that finished between
+        the caller's lookup and it joining the flight has already answered.
+        """
+        verified = self.verifications.lookup(key)
+        if verified is not None:
+            return verified
+        verified = self.verify_with_github(token, http_user)
+        if verified is not None:
+            self.verifications.remember(key, verified)
+        return verified
+
+    async def acheck_token(self, key, token, http_user):
+        """
+        Asynchronous counterpart of check_token.
+        """
+        verified = self.verifications.lookup(key)
+        if verified is not None:
+            return verified
+        verified = await self.averify_with_github(token, http_user)
+        if verified is not None:
+            self.verifications.remember(key, verified)
+        return verified
+
+    async def acoalesce_check(self, key, token, http_user):
+        """
+        Share one in-flight async GitHub check between concurrent requests.
 
+        The check runs as its own task and each waiter is shielded from it,
+        so a client disconnecting does not cancel the check for the others.
+        """
+        flight = (asyncio.get_running_loop(), key)
+        task = self.async_inflight.get(flight)
+        if task is None:
+            task = asyncio.ensure_future(self.acheck_token(key, token, http_user))
+            self.async_inflight[flight] = task
+            task.add_done_callback(lambda _: self.async_inflight.pop(flight, None))
+        return await asyncio.shield(task)
+
+    def verify_with_github(self, token, http_user):
+        """
+        Ask GitHub who owns the token and compare it with the claimed user.
+
+        Args:
+            token: The raw value of the Authorization header
+            http_user: The GitHub login claimed in the User header
+
+        Returns:
+            bool | None: True if the token belongs to the user, False if GitHub
+            rejected the token or it belongs to someone else, and None when
+            GitHub could not give a definitive answer (outages, rate limits,
+            timeouts), which must not be cached
+        """
         headers = {
             "Authorization": f"{token}",
         }
 
         # Fetch the authenticated user's details
-        user_response = requests.get("https://api.github.com/user", headers=headers)
+        try:
+            user_response = http.session.get(
+                f"{settings.GITHUB_API_URL}/user",
+                headers = headers,
+                timeout = settings.HTTP_TIMEOUT
+            )
+        except requests.RequestException:
+            return None
+        return self.read_verdict(user_response, http_user)
+
+    async def averify_with_github(self, token, http_user):
+        """
+        Asynchronous counterpart of verify_with_github.
+        """
+        headers = {
+            "Authorization": f"{token}",
+        }
+        try:
+            user_response = await http.get_async_client().get(
+                f"{settings.GITHUB_API_URL}/user",
+                headers = headers
+            )
+        except httpx.HTTPError:
+            return None
+        return self.read_verdict(user_response, http_user)
+
+    @staticmethod
+    def read_verdict(user_response, http_user):
+        """
+        Interpret GitHub's /user response; see verify_with_github.
+        """
         if user_response.status_code == 200:
             user_data = user_response.json()
-            if user_data.get("login") == http_user:
-                # User is authenticated
-                response = self.get_response(request)
-                return response
-            else:
-                # User is not authenticated
-                return JsonResponse({"detail": "Forbidden"}, status=403)
-        else:
-            return JsonResponse({"detail": "Forbidden"}, status=403)
+            return user_data.get("login") == http_user
+        if user_response.status_code == 401:
+            return False
+        return None
@@ -1,4 +1,5 @@
 import os
+import secrets
 from dotenv import load_dotenv
 
 from pathlib import Path
@@ -35,7 +36,7 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
-        'NAME': 'api',
+        'NAME': os.getenv('API_DB_NAME', 'api'),
         'USER': os.getenv('API_DB_USER'),
         'PASSWORD': os.getenv('API_DB_PASS'),
         'HOST': "localhost",
@@ -63,6 +64,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "core.metrics.MetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -73,6 +75,77 @@ MIDDLEWARE = [
     "core.middleware.GitHubTokenAuthenticationMiddleware",
 ]
 
+# Upstream service locations; overridden to point at local stand-ins when benchmarking
+GITHUB_API_URL = os.getenv("GITHUB_API_URL", "https://api.github.com")
+OPENWEATHER_URL = os.getenv("OPENWEATHER_URL", "https://api.openweathermap.org")
+OPEN_AI_URL = os.getenv("OPEN_AI_URL")
+
+# Climate data is refreshed in the background once 10 minutes old, but served
+# for at most CLIMATE_MAX_STALENESS seconds; failed refreshes are retried
+# after CLIMATE_REFRESH_RETRY seconds
+CLIMATE_MAX_STALENESS = int(os.getenv("CLIMATE_MAX_STALENESS", 3600))
+CLIMATE_REFRESH_RETRY = int(os.getenv("CLIMATE_REFRESH_RETRY", 30))
+
+# Locations are snapped to a CLIMATE_GRID-degree grid and at most
+# CLIMATE_MAX_LOCATIONS cells are held; upstream calls are limited to
+# CLIMATE_FETCH_RATE per second in bursts of CLIMATE_FETCH_BURST, and a
+# request waits up to CLIMATE_FETCH_WAIT seconds for a new location. The
+# budget is kept in CACHES, so it only covers every worker when that cache
+# is shared; with local memory each process has the whole budget, so
+# divide the upstream quota by the number of processes
+CLIMATE_GRID = float(os.getenv("CLIMATE_GRID", 0.05))
+CLIMATE_MAX_LOCATIONS = int(os.getenv("CLIMATE_MAX_LOCATIONS", 256))
+CLIMATE_FETCH_RATE = float(os.getenv("CLIMATE_FETCH_RATE", 1))
+CLIMATE_FETCH_BURST = int(os.getenv("CLIMATE_FETCH_BURST", 5))
+CLIMATE_FETCH_WAIT = float(os.getenv("CLIMATE_FETCH_WAIT", 15))
+
+# Seconds between bulk writes of buffered presence heartbeats
+PRESENCE_FLUSH_INTERVAL = float(os.getenv("PRESENCE_FLUSH_INTERVAL", 5))
+
+# Characters unseen for PRESENCE_TTL seconds are marked inactive, by the
+# expire_presence command or every PRESENCE_SWEEP_INTERVAL seconds by the
+# heartbeat flusher (0 leaves sweeping to the command)
+PRESENCE_TTL = int(os.getenv("PRESENCE_TTL", 300))
+PRESENCE_SWEEP_INTERVAL = float(os.getenv("PRESENCE_SWEEP_INTERVAL", 60))
+
+# Seconds between the presence feed's reads of active characters
+PRESENCE_FEED_INTERVAL = float(os.getenv("PRESENCE_FEED_INTERVAL", 2))
+
+# Item binaries are stored, and streamed back, in chunks of this many bytes;
+# an upload is refused as soon as it passes INVENTORY_UPLOAD_MAX_SIZE bytes
+INVENTORY_BLOB_CHUNK_SIZE = int(os.getenv("INVENTORY_BLOB_CHUNK_SIZE", 65536))
+INVENTORY_UPLOAD_MAX_SIZE = int(os.getenv("INVENTORY_UPLOAD_MAX_SIZE", 10485760))
+
+# Outbound HTTP to upstream services: timeout in seconds, pooled connections per host
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", 5))
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", 20))
+
+# GitHub token verification cache; TTLs are in seconds
+GITHUB_AUTH_CACHE_SIZE = int(os.getenv("GITHUB_AUTH_CACHE_SIZE", 4096))
+GITHUB_AUTH_CACHE_TTL = int(os.getenv("GITHUB_AUTH_CACHE_TTL", 300))
+GITHUB_AUTH_NEGATIVE_CACHE_TTL = int(os.getenv("GITHUB_AUTH_NEGATIVE_CACHE_TTL", 30))
+
+# Cache shared by every worker process; point it at memcached or Redis in
+# production (e.g. django.core.cache.backends.redis.RedisCache)
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv("CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": os.getenv("CACHE_LOCATION", ""),
+    }
+}
+
+# Paths served without a GitHub token (the metrics scraper has none)
+GITHUB_AUTH_EXEMPT_PATHS = ["/v1/metrics"]
+
+# Bearer token required by the metrics endpoint, which is disabled while unset
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+# Signed session tokens issued after a GitHub check. Without a configured
+# secret each process signs with its own random key, so tokens are only
+# honoured by the worker that issued them.
+SESSION_TOKEN_SECRET = os.getenv("SESSION_TOKEN_SECRET") or secrets.token_urlsafe(32)
+SESSION_TOKEN_MAX_AGE = int(os.getenv("SESSION_TOKEN_MAX_AGE", 900))
+
 TEMPLATES = [
     {
         "BACKEND": "django.template.backends.django.DjangoTemplates",
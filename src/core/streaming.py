@@ -0,0 +1,37 @@
+"""
+Helpers for streaming responses under both WSGI and ASGI.
+"""
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+
+
+def streamed(request, chunks):
+    """
+    Fit an iterator of response chunks to the server handling request.
+
+    Under ASGI, Django turns a synchronous iterator into a list before
+    sending any of it, so a stream of database reads would be held in
+    memory whole. There the chunks are instead pulled one at a time in the
+    request's worker thread, where its database connection lives; under
+    WSGI the iterator is returned as it is.
+
+    Args:
+        request: A Django HttpRequest or a DRF Request wrapping one
+        chunks: An iterator of str or bytes
+    """
+    if not isinstance(getattr(request, '_request', request), ASGIRequest):
+        return chunks
+    return _pull(chunks)
+
+
+async def _pull(chunks):
+    step = sync_to_async(next)
+    try:
+        while (chunk := await step(chunks, None)) is not None:
+            yield chunk
+    finally:
+        # Release any cursor the iterator holds if the client went away
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            await sync_to_async(close)()
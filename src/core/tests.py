@@ -0,0 +1,118 @@
+import threading
+import time
+
+from django.test import SimpleTestCase, override_settings
+
+from core.cache import SingleFlight, TTLCache
+from core.tokens import issue_session_token, verify_session_token
+
+
+class TTLCacheTests(SimpleTestCase):
+
+    def test_entries_expire(self):
+        cache = TTLCache(maxsize = 10, ttl = 60)
+        cache.set("short", 1, ttl = 0.01)
+        cache.set("long", 2)
+        time.sleep(0.02)
+        self.assertIsNone(cache.get("short"))
+        self.assertEqual(cache.get("short", "missing"), "missing")
+        self.assertEqual(cache.get("long"), 2)
+        self.assertEqual(len(cache), 1)
+
+    def test_least_recently_used_is_evicted(self):
+        cache = TTLCache(maxsize = 2, ttl = 60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        # Reading a makes b the least recently used
+        cache.get("a")
+        cache.set("c", 3)
+        self.assertEqual(cache.get("a"), 1)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("c"), 3)
+
+    def test_delete_and_clear(self):
+        cache = TTLCache(maxsize = 10, ttl = 60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        self.assertTrue(cache.delete("a"))
+        self.assertFalse(cache.delete("a"))
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+
+
+class SingleFlightTests(SimpleTestCase):
+
+    def run_together(self, flight, fn, callers = 5):
+        results = []
+        errors = []
+
+        def call():
+            try:
+                results.append(flight.do("key", fn))
+            except Exception as error:
+                errors.append(error)
+
+        threads = [threading.Thread(target = call) for _ in range(callers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results, errors
+
+    def test_concurrent_calls_share_one_execution(self):
+        flight = SingleFlight()
+        calls = []
+        release = threading.Event()
+
+        def slow():
+            calls.append(1)
+            release.wait(1)
+            return "answer"
+
+        # Hold the leader until the others have had time to join it
+        threading.Timer(0.1, release.set).start()
+        results, errors = self.run_together(flight, slow)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ["answer"] * 5)
+        self.assertEqual(errors, [])
+
+    def test_error_is_raised_to_every_caller(self):
+        flight = SingleFlight()
+        release = threading.Event()
+
+        def failing():
+            release.wait(1)
+            raise RuntimeError("upstream down")
+
+        threading.Timer(0.1, release.set).start()
+        results, errors = self.run_together(flight, failing)
+        self.assertEqual(results, [])
+        self.assertEqual(len(errors), 5)
+        self.assertTrue(all(isinstance(error, RuntimeError) for error in errors))
+
+    def test_key_is_free_again_once_done(self):
+        flight = SingleFlight()
+        self.assertEqual(flight.do("key", lambda: 1), 1)
+        self.assertEqual(flight.do("key", lambda: 2), 2)
+
+
+class SessionTokenTests(SimpleTestCase):
+
+    def test_token_stands_in_for_its_login(self):
+        token = issue_session_token("alice")
+        self.assertTrue(verify_session_token(token, "alice"))
+
+    def test_token_is_refused_for_another_login(self):
+        token = issue_session_token("alice")
+        self.assertFalse(verify_session_token(token, "mallory"))
+
+    def test_tampered_token_is_refused(self):
+        token = issue_session_token("alice")
+        login, timestamp, signature = token.split(":")
+        self.assertFalse(verify_session_token(f"mallory:{timestamp}:{signature}", "mallory"))
+        self.assertFalse(verify_session_token("not a token", "alice"))
+
+    def test_expired_token_is_refused(self):
+        token = issue_session_token("alice")
+        with override_settings(SESSION_TOKEN_MAX_AGE = -1):
+            self.assertFalse(verify_session_token(token, "alice"))
@@ -0,0 +1,58 @@
+"""
+Short-lived session tokens for clients that have already proven who they are.
+
+Once GitHubTokenAuthenticationMiddleware has confirmed a login through
+GitHub, it hands the client a token binding that login to the time it was
+issued, signed with HMAC-SHA256. Presenting the token on later requests
+lets the login be checked locally, without a call to GitHub, until the
+token expires.
+"""
+
+import hmac
+
+from django.conf import settings
+from django.core import signing
+
+SESSION_TOKEN_SALT = "core.tokens.session"
+
+
+def _signer():
+    return signing.TimestampSigner(
+        key = settings.SESSION_TOKEN_SECRET,
+        salt = SESSION_TOKEN_SALT
+    )
+
+
+def issue_session_token(login):
+    """
+    Create a signed session token for a GitHub login.
+
+    Args:
+        login: The GitHub login that has just been confirmed
+
+    Returns:
+        str: The token, to be returned to the client in a response header
+    """
+    return _signer().sign(login)
+
+
+def verify_session_token(token, login):
+    """
+    Check that a session token is authentic, unexpired and issued to login.
+
+    Args:
+        token: The session token presented by the client
+        login: The GitHub login the request claims to come from
+
+    Returns:
+        bool: True if the token may stand in for a GitHub check of login
+    """
+    try:
+        signed_login = _signer().unsign(
+            token,
+            max_age = settings.SESSION_TOKEN_MAX_AGE
+        )
+    except signing.BadSignature:
+        # Also covers signing.SignatureExpired
+        return False
+    return hmac.compare_digest(signed_login, login)
@@ -4,7 +4,10 @@ from rest_framework import permissions
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
 
+from core.views import metrics_view
+
 urlpatterns = [
+    path('v1/metrics', metrics_view, name='metrics'),
     re_path(
         r'v1/climate/',
         include(('climate.urls', 'climate'))
@@ -0,0 +1,26 @@
+import hmac
+
+from django.conf import settings
+from django.http import HttpResponse
+
+from core import metrics
+
+
+def metrics_view(request):
+    """
+    Expose this process's request metrics for a Prometheus scraper.
+
+    The scraper must present METRICS_TOKEN as a bearer token. Until a
+    token is configured the endpoint answers 404, as if it did not exist.
+    """
+    if not settings.METRICS_TOKEN:
+        return HttpResponse(status = 404)
+    supplied = request.META.get("HTTP_AUTHORIZATION", "")
+    expected = f"Bearer {settings.METRICS_TOKEN}"
+    if not hmac.compare_digest(supplied.encode(), expected.encode()):
+        return HttpResponse(status = 403)
+    return HttpResponse(
+        metrics.render(),
+        status = 200,
+        content_type = "text/plain; version=0.0.4; charset=utf-8"
+    )
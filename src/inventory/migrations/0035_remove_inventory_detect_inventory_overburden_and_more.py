@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:37
+
+import pgtrigger.compiler
+import pgtrigger.migrations
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0034_remove_inventory_detect_inventory_overburden_and_more'),
+    ]
+
+    operations = [
+        pgtrigger.migrations.RemoveTrigger(
+            model_name='inventory',
+            name='detect_inventory_overburden',
+        ),
+        pgtrigger.migrations.AddTrigger(
+            model_name='inventory',
+            trigger=pgtrigger.compiler.Trigger(name='detect_inventory_overburden', sql=pgtrigger.compiler.UpsertTriggerSql(func="\n            DECLARE\n                volume int;\n            BEGIN\n                volume := NEW.item_weight + (SELECT SUM(item_bulk) FROM inventory_inventory WHERE item_owner_id = NEW.item_owner_id);\n                IF volume > 11 THEN\n                    RAISE EXCEPTION 'overburdened';\n                END IF;\n                RETURN NEW;\n            END;\n        ", hash='5f80125bc38343684a647014a406afa2ea6eb7f0', operation='INSERT OR UPDATE', pgid='pgtrigger_detect_inventory_overburden_afc87', table='inventory_inventory', when='AFTER')),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:38
+
+import django.db.models.deletion
+import pgtrigger.compiler
+import pgtrigger.migrations
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0035_remove_inventory_detect_inventory_overburden_and_more'),
+        ('omnipresence', '0007_omnipresencemodel_omnipresence_working_dir_tree'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InventoryBurden',
+            fields=[
+                ('owner', models.OneToOneField(on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='burden', serialize=False, to='omnipresence.omnipresencemodel')),
+                ('carried_bulk', models.FloatField(default=0.0)),
+            ],
+        ),
+        pgtrigger.migrations.RemoveTrigger(
+            model_name='inventory',
+            name='detect_inventory_overburden',
+        ),
+        # Start every owner's total from what they carry today
+        migrations.RunSQL(
+            sql="""
+                INSERT INTO inventory_inventoryburden (owner_id, carried_bulk)
+                SELECT item_owner_id, SUM(item_bulk)
+                FROM inventory_inventory
+                GROUP BY item_owner_id
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        pgtrigger.migrations.AddTrigger(
+            model_name='inventory',
+            trigger=pgtrigger.compiler.Trigger(name='track_inventory_burden', sql=pgtrigger.compiler.UpsertTriggerSql(func="\n            DECLARE\n                delta double precision;\n                carried double precision;\n            BEGIN\n                IF TG_OP = 'DELETE' OR (TG_OP = 'UPDATE' AND OLD.item_owner_id <> NEW.item_owner_id) THEN\n                    UPDATE inventory_inventoryburden\n                    SET carried_bulk = carried_bulk - OLD.item_bulk\n                    WHERE owner_id = OLD.item_owner_id;\n                    IF TG_OP = 'DELETE' THEN\n                        RETURN OLD;\n                    END IF;\n                    delta := NEW.item_bulk;\n                ELSIF TG_OP = 'UPDATE' THEN\n                    delta := NEW.item_bulk - OLD.item_bulk;\n                ELSE\n                    delta := NEW.item_bulk;\n                END IF;\n                INSERT INTO inventory_inventoryburden (owner_id, carried_bulk)\n                VALUES (NEW.item_owner_id, delta)\n                ON CONFLICT (owner_id) DO UPDATE\n                SET carried_bulk = inventory_inventoryburden.carried_bulk + EXCLUDED.carried_bulk\n                RETURNING carried_bulk INTO carried;\n                -- Only picking things up can overburden; dropping them always works\n                IF delta > 0 AND NEW.item_weight + carried > 11 THEN\n                    RAISE EXCEPTION 'overburdened';\n                END IF;\n                RETURN NEW;\n            END;\n        ", hash='bfd8972d9f66d788746ce08fb465fd029a4e6b45', operation='INSERT OR UPDATE OR DELETE', pgid='pgtrigger_track_inventory_burden_0d75b', table='inventory_inventory', when='AFTER')),
+        ),
+    ]
@@ -0,0 +1,58 @@
+from django.db import migrations
+from django.db.models import Count, F, Min, Sum
+
+
+def merge_duplicate_items(apps, schema_editor):
+    """
+    Fold every stack an owner holds twice into its oldest row, so the
+    unique constraint on (item_owner, item_name) can be added.
+    """
+    Inventory = apps.get_model('inventory', 'Inventory')
+    InventoryBurden = apps.get_model('inventory', 'InventoryBurden')
+    duplicates = list(
+        Inventory.objects.values('item_owner_id', 'item_name').annotate(
+            keep = Min('id'),
+            qty = Sum('item_qty'),
+            rows = Count('id')
+        ).filter(rows__gt = 1)
+    )
+    if not duplicates:
+        return
+    postgres = schema_editor.connection.vendor == 'postgresql'
+    if postgres:
+        # Merging moves bulk around within one owner; keep the overburden
+        # check out of it and recount the totals afterwards instead
+        schema_editor.execute('ALTER TABLE inventory_inventory DISABLE TRIGGER USER')
+    owners = set()
+    for group in duplicates:
+        stacks = Inventory.objects.filter(
+            item_owner_id = group['item_owner_id'],
+            item_name = group['item_name']
+        )
+        stacks.exclude(id = group['keep']).delete()
+        stacks.filter(id = group['keep']).update(
+            item_qty = group['qty'],
+            item_bulk = group['qty'] * F('item_weight')
+        )
+        owners.add(group['item_owner_id'])
+    if postgres:
+        schema_editor.execute('ALTER TABLE inventory_inventory ENABLE TRIGGER USER')
+    for owner_id in owners:
+        carried = Inventory.objects.filter(item_owner_id = owner_id).aggregate(
+            carried = Sum('item_bulk')
+        )['carried'] or 0.0
+        InventoryBurden.objects.update_or_create(
+            owner_id = owner_id,
+            defaults = {'carried_bulk': carried}
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0036_inventoryburden'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_items, migrations.RunPython.noop),
+    ]
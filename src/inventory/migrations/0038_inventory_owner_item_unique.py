@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0037_merge_duplicate_items'),
+        ('omnipresence', '0007_omnipresencemodel_omnipresence_working_dir_tree'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='inventory',
+            constraint=models.UniqueConstraint(fields=('item_owner', 'item_name'), name='inventory_owner_item_unique'),
+        ),
+    ]
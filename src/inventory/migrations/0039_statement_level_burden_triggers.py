@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:42
+
+import pgtrigger.compiler
+import pgtrigger.migrations
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0038_inventory_owner_item_unique'),
+    ]
+
+    operations = [
+        pgtrigger.migrations.RemoveTrigger(
+            model_name='inventory',
+            name='track_inventory_burden',
+        ),
+        pgtrigger.migrations.AddTrigger(
+            model_name='inventory',
+            trigger=pgtrigger.compiler.Trigger(name='track_inventory_burden_on_insert', sql=pgtrigger.compiler.UpsertTriggerSql(func="\n            BEGIN\n                INSERT INTO inventory_inventoryburden (owner_id, carried_bulk)\n                SELECT owner_id, SUM(bulk)\n                FROM (\n            SELECT item_owner_id AS owner_id, item_bulk AS bulk, item_weight AS weight\n            FROM new_items\n        ) AS moved\n                GROUP BY owner_id\n                HAVING SUM(bulk) <> 0\n                ORDER BY owner_id\n                ON CONFLICT (owner_id) DO UPDATE\n                SET carried_bulk = inventory_inventoryburden.carried_bulk + EXCLUDED.carried_bulk;\n                \n        -- Only picking things up can overburden; dropping them always works\n        IF EXISTS (\n            SELECT 1\n            FROM (\n            SELECT item_owner_id AS owner_id, item_bulk AS bulk, item_weight AS weight\n            FROM new_items\n        ) AS moved\n            JOIN inventory_inventoryburden AS burden USING (owner_id)\n            GROUP BY owner_id, burden.carried_bulk\n            HAVING SUM(moved.bulk) > 0\n            AND MAX(moved.weight) + burden.carried_bulk > 11\n        ) THEN\n            RAISE EXCEPTION 'overburdened';\n        END IF;\n    \n                RETURN NULL;\n            END;\n        ", hash='b7c849ce0ae6c7e0208767c9613b8bab60b39e61', level='STATEMENT', operation='INSERT', pgid='pgtrigger_track_inventory_burden_on_insert_ff3b9', referencing='REFERENCING NEW TABLE AS new_items ', table='inventory_inventory', when='AFTER')),
+        ),
+        pgtrigger.migrations.AddTrigger(
+            model_name='inventory',
+            trigger=pgtrigger.compiler.Trigger(name='track_inventory_burden_on_update', sql=pgtrigger.compiler.UpsertTriggerSql(func="\n            BEGIN\n                INSERT INTO inventory_inventoryburden (owner_id, carried_bulk)\n                SELECT owner_id, SUM(bulk)\n                FROM (\n            SELECT item_owner_id AS owner_id, item_bulk AS bulk, item_weight AS weight\n            FROM new_items\n            UNION ALL\n            SELECT item_owner_id, -item_bulk, NULL\n            FROM old_items\n        ) AS moved\n                GROUP BY owner_id\n                HAVING SUM(bulk) <> 0\n                ORDER BY owner_id\n                ON CONFLICT (owner_id) DO UPDATE\n                SET carried_bulk = inventory_inventoryburden.carried_bulk + EXCLUDED.carried_bulk;\n                \n        -- Only picking things up can overburden; dropping them always works\n        IF EXISTS (\n            SELECT 1\n            FROM (\n            SELECT item_owner_id AS owner_id, item_bulk AS bulk, item_weight AS weight\n            FROM new_items\n            UNION ALL\n            SELECT item_owner_id, -item_bulk, NULL\n            FROM old_items\n        ) AS moved\n            JOIN inventory_inventoryburden AS burden USING (owner_id)\n            GROUP BY owner_id, burden.carried_bulk\n            HAVING SUM(moved.bulk) > 0\n            AND MAX(moved.weight) + burden.carried_bulk > 11\n        ) THEN\n            RAISE EXCEPTION 'overburdened';\n        END IF;\n    \n                RETURN NULL;\n            END;\n        ", hash='d9a8d2238b011d04948609e58792f01474732d77', level='STATEMENT', operation='UPDATE', pgid='pgtrigger_track_inventory_burden_on_update_57ddb', referencing='REFERENCING OLD TABLE AS old_items  NEW TABLE AS new_items ', table='inventory_inventory', when='AFTER')),
+        ),
+        pgtrigger.migrations.AddTrigger(
+            model_name='inventory',
+            trigger=pgtrigger.compiler.Trigger(name='track_inventory_burden_on_delete', sql=pgtrigger.compiler.UpsertTriggerSql(func='\n            BEGIN\n                INSERT INTO inventory_inventoryburden (owner_id, carried_bulk)\n                SELECT owner_id, SUM(bulk)\n                FROM (\n            SELECT item_owner_id AS owner_id, -item_bulk AS bulk, NULL::double precision AS weight\n            FROM old_items\n        ) AS moved\n                GROUP BY owner_id\n                HAVING SUM(bulk) <> 0\n                ORDER BY owner_id\n                ON CONFLICT (owner_id) DO UPDATE\n                SET carried_bulk = inventory_inventoryburden.carried_bulk + EXCLUDED.carried_bulk;\n                \n                RETURN NULL;\n            END;\n        ', hash='82318bf0006cfeaa2f2466f5cf654a3d50221862', level='STATEMENT', operation='DELETE', pgid='pgtrigger_track_inventory_burden_on_delete_f71c3', referencing='REFERENCING OLD TABLE AS old_items ', table='inventory_inventory', when='AFTER')),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0039_statement_level_burden_triggers'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InventoryBlob',
+            fields=[
+                ('digest', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('data', models.BinaryField()),
+                ('size', models.IntegerField()),
+                ('refcount', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='inventory',
+            name='item_blob',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, to='inventory.inventoryblob'),
+        ),
+    ]
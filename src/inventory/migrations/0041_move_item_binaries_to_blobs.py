@@ -0,0 +1,43 @@
+import hashlib
+from collections import defaultdict
+
+from django.db import migrations
+
+
+def move_binaries_to_blobs(apps, schema_editor):
+    """
+    Store each distinct item binary once, keyed by its SHA-256 digest, and
+    point every stack at it with its reference counted.
+    """
+    Inventory = apps.get_model('inventory', 'Inventory')
+    InventoryBlob = apps.get_model('inventory', 'InventoryBlob')
+    stacks = defaultdict(list)
+    for item in Inventory.objects.only('id', 'item_bytestring').iterator(chunk_size = 500):
+        data = bytes(item.item_bytestring)
+        digest = hashlib.sha256(data).hexdigest()
+        if digest not in stacks:
+            InventoryBlob.objects.create(digest = digest, data = data, size = len(data))
+        stacks[digest].append(item.id)
+    for digest, ids in stacks.items():
+        Inventory.objects.filter(id__in = ids).update(item_blob_id = digest)
+        InventoryBlob.objects.filter(digest = digest).update(refcount = len(ids))
+
+
+def move_blobs_to_binaries(apps, schema_editor):
+    Inventory = apps.get_model('inventory', 'Inventory')
+    InventoryBlob = apps.get_model('inventory', 'InventoryBlob')
+    for blob in InventoryBlob.objects.iterator(chunk_size = 100):
+        Inventory.objects.filter(item_blob_id = blob.digest).update(
+            item_bytestring = blob.data
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0040_inventoryblob'),
+    ]
+
+    operations = [
+        migrations.RunPython(move_binaries_to_blobs, move_blobs_to_binaries),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:45
+
+import django.db.models.deletion
+import pgtrigger.compiler
+import pgtrigger.migrations
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0041_move_item_binaries_to_blobs'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='inventory',
+            name='item_blob',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='inventory.inventoryblob'),
+        ),
+        migrations.RemoveField(
+            model_name='inventory',
+            name='item_bytestring',
+        ),
+        pgtrigger.migrations.AddTrigger(
+            model_name='inventory',
+            trigger=pgtrigger.compiler.Trigger(name='count_blob_references_on_insert', sql=pgtrigger.compiler.UpsertTriggerSql(func='\n            BEGIN\n                PERFORM 1\n                FROM inventory_inventoryblob\n                WHERE digest IN (SELECT digest FROM (SELECT item_blob_id AS digest, 1 AS refs FROM new_items) AS moved)\n                ORDER BY digest\n                FOR UPDATE;\n                UPDATE inventory_inventoryblob AS blob\n                SET refcount = blob.refcount + counted.refs\n                FROM (\n                    SELECT digest, SUM(refs) AS refs\n                    FROM (SELECT item_blob_id AS digest, 1 AS refs FROM new_items) AS moved\n                    GROUP BY digest\n                    HAVING SUM(refs) <> 0\n                ) AS counted\n                WHERE blob.digest = counted.digest;\n                DELETE FROM inventory_inventoryblob\n                WHERE refcount <= 0\n                AND digest IN (SELECT digest FROM (SELECT item_blob_id AS digest, 1 AS refs FROM new_items) AS moved);\n                RETURN NULL;\n            END;\n        ', hash='d8236a0e4e3cd60850a13e3a07126a7e9a794fce', level='STATEMENT', operation='INSERT', pgid='pgtrigger_count_blob_references_on_insert_d6bed', referencing='REFERENCING NEW TABLE AS new_items ', table='inventory_inventory', when='AFTER')),
+        ),
+        pgtrigger.migrations.AddTrigger(
+            model_name='inventory',
+            trigger=pgtrigger.compiler.Trigger(name='count_blob_references_on_update', sql=pgtrigger.compiler.UpsertTriggerSql(func='\n            BEGIN\n                PERFORM 1\n                FROM inventory_inventoryblob\n                WHERE digest IN (SELECT digest FROM (\n            SELECT item_blob_id AS digest, 1 AS refs FROM new_items\n            UNION ALL\n            SELECT item_blob_id, -1 FROM old_items\n        ) AS moved)\n                ORDER BY digest\n                FOR UPDATE;\n                UPDATE inventory_inventoryblob AS blob\n                SET refcount = blob.refcount + counted.refs\n                FROM (\n                    SELECT digest, SUM(refs) AS refs\n                    FROM (\n            SELECT item_blob_id AS digest, 1 AS refs FROM new_items\n            UNION ALL\n            SELECT item_blob_id, -1 FROM old_items\n        ) AS moved\n                    GROUP BY digest\n                    HAVING SUM(refs) <> 0\n                ) AS counted\n                WHERE blob.digest = counted.digest;\n                DELETE FROM inventory_inventoryblob\n                WHERE refcount <= 0\n                AND digest IN (SELECT digest FROM (\n            SELECT item_blob_id AS digest, 1 AS refs FROM new_items\n            UNION ALL\n            SELECT item_blob_id, -1 FROM old_items\n        ) AS moved);\n                RETURN NULL;\n            END;\n        ', hash='9263ac5836ae44f0c3efb2de0a2a8e2062c9f1db', level='STATEMENT', operation='UPDATE', pgid='pgtrigger_count_blob_references_on_update_1be35', referencing='REFERENCING OLD TABLE AS old_items  NEW TABLE AS new_items ', table='inventory_inventory', when='AFTER')),
+        ),
+        pgtrigger.migrations.AddTrigger(
+            model_name='inventory',
+            trigger=pgtrigger.compiler.Trigger(name='count_blob_references_on_delete', sql=pgtrigger.compiler.UpsertTriggerSql(func='\n            BEGIN\n                PERFORM 1\n                FROM inventory_inventoryblob\n                WHERE digest IN (SELECT digest FROM (SELECT item_blob_id AS digest, -1 AS refs FROM old_items) AS moved)\n                ORDER BY digest\n                FOR UPDATE;\n                UPDATE inventory_inventoryblob AS blob\n                SET refcount = blob.refcount + counted.refs\n                FROM (\n                    SELECT digest, SUM(refs) AS refs\n                    FROM (SELECT item_blob_id AS digest, -1 AS refs FROM old_items) AS moved\n                    GROUP BY digest\n                    HAVING SUM(refs) <> 0\n                ) AS counted\n                WHERE blob.digest = counted.digest;\n                DELETE FROM inventory_inventoryblob\n                WHERE refcount <= 0\n                AND digest IN (SELECT digest FROM (SELECT item_blob_id AS digest, -1 AS refs FROM old_items) AS moved);\n                RETURN NULL;\n            END;\n        ', hash='5506af06d229bcdae6f829e3dc495ccca69a2b6a', level='STATEMENT', operation='DELETE', pgid='pgtrigger_count_blob_references_on_delete_1354a', referencing='REFERENCING OLD TABLE AS old_items ', table='inventory_inventory', when='AFTER')),
+        ),
+    ]
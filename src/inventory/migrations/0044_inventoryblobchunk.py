@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0042_remove_inventory_item_bytestring'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InventoryBlobChunk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('seq', models.IntegerField()),
+                ('data', models.BinaryField()),
+            ],
+            options={
+                'ordering': ['seq'],
+            },
+        ),
+        migrations.AlterField(
+            model_name='inventoryblob',
+            name='data',
+            field=models.BinaryField(null=True),
+        ),
+        migrations.AddField(
+            model_name='inventoryblob',
+            name='chunk_size',
+            field=models.IntegerField(default=65536),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='inventoryblobchunk',
+            name='blob',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='chunks', to='inventory.inventoryblob'),
+        ),
+        migrations.AddConstraint(
+            model_name='inventoryblobchunk',
+            constraint=models.UniqueConstraint(fields=('blob', 'seq'), name='inventory_blob_chunk_unique'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+from django.db import migrations
+
+# Chunk size of the blobs moved here; each blob records its own
+CHUNK_SIZE = 65536
+
+
+def split_blobs_into_chunks(apps, schema_editor):
+    InventoryBlob = apps.get_model('inventory', 'InventoryBlob')
+    InventoryBlobChunk = apps.get_model('inventory', 'InventoryBlobChunk')
+    for blob in InventoryBlob.objects.iterator(chunk_size = 100):
+        data = bytes(blob.data)
+        InventoryBlobChunk.objects.bulk_create([
+            InventoryBlobChunk(blob_id = blob.digest, seq = seq, data = data[offset:offset + CHUNK_SIZE])
+            for seq, offset in enumerate(range(0, len(data), CHUNK_SIZE))
+        ])
+    InventoryBlob.objects.update(chunk_size = CHUNK_SIZE)
+
+
+def join_chunks_into_blobs(apps, schema_editor):
+    InventoryBlob = apps.get_model('inventory', 'InventoryBlob')
+    InventoryBlobChunk = apps.get_model('inventory', 'InventoryBlobChunk')
+    for blob in InventoryBlob.objects.only('digest').iterator(chunk_size = 100):
+        chunks = InventoryBlobChunk.objects.filter(blob_id = blob.digest).order_by('seq')
+        InventoryBlob.objects.filter(digest = blob.digest).update(
+            data = b"".join(bytes(data) for data in chunks.values_list('data', flat = True))
+        )
+    InventoryBlobChunk.objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0044_inventoryblobchunk'),
+    ]
+
+    operations = [
+        migrations.RunPython(split_blobs_into_chunks, join_chunks_into_blobs),
+    ]
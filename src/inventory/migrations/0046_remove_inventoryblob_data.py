@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:51
+
+import pgtrigger.compiler
+import pgtrigger.migrations
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0045_move_blob_data_to_chunks'),
+    ]
+
+    operations = [
+        pgtrigger.migrations.RemoveTrigger(
+            model_name='inventory',
+            name='count_blob_references_on_insert',
+        ),
+        pgtrigger.migrations.RemoveTrigger(
+            model_name='inventory',
+            name='count_blob_references_on_update',
+        ),
+        pgtrigger.migrations.RemoveTrigger(
+            model_name='inventory',
+            name='count_blob_references_on_delete',
+        ),
+        migrations.RemoveField(
+            model_name='inventoryblob',
+            name='data',
+        ),
+        pgtrigger.migrations.AddTrigger(
+            model_name='inventory',
+            trigger=pgtrigger.compiler.Trigger(name='count_blob_references_on_insert', sql=pgtrigger.compiler.UpsertTriggerSql(func='\n            BEGIN\n                PERFORM 1\n                FROM inventory_inventoryblob\n                WHERE digest IN (SELECT digest FROM (SELECT item_blob_id AS digest, 1 AS refs FROM new_items) AS moved)\n                ORDER BY digest\n                FOR UPDATE;\n                UPDATE inventory_inventoryblob AS blob\n                SET refcount = blob.refcount + counted.refs\n                FROM (\n                    SELECT digest, SUM(refs) AS refs\n                    FROM (SELECT item_blob_id AS digest, 1 AS refs FROM new_items) AS moved\n                    GROUP BY digest\n                    HAVING SUM(refs) <> 0\n                ) AS counted\n                WHERE blob.digest = counted.digest;\n                DELETE FROM inventory_inventoryblobchunk\n                WHERE blob_id IN (\n                    SELECT digest FROM inventory_inventoryblob\n                    WHERE refcount <= 0\n                    AND digest IN (SELECT digest FROM (SELECT item_blob_id AS digest, 1 AS refs FROM new_items) AS moved)\n                );\n                DELETE FROM inventory_inventoryblob\n                WHERE refcount <= 0\n                AND digest IN (SELECT digest FROM (SELECT item_blob_id AS digest, 1 AS refs FROM new_items) AS moved);\n                RETURN NULL;\n            END;\n        ', hash='0030e5894e239a93977284e8e5c00d59c08bf11b', level='STATEMENT', operation='INSERT', pgid='pgtrigger_count_blob_references_on_insert_d6bed', referencing='REFERENCING NEW TABLE AS new_items ', table='inventory_inventory', when='AFTER')),
+        ),
+        pgtrigger.migrations.AddTrigger(
+            model_name='inventory',
+            trigger=pgtrigger.compiler.Trigger(name='count_blob_references_on_update', sql=pgtrigger.compiler.UpsertTriggerSql(func='\n            BEGIN\n                PERFORM 1\n                FROM inventory_inventoryblob\n                WHERE digest IN (SELECT digest FROM (\n            SELECT item_blob_id AS digest, 1 AS refs FROM new_items\n            UNION ALL\n            SELECT item_blob_id, -1 FROM old_items\n        ) AS moved)\n                ORDER BY digest\n                FOR UPDATE;\n                UPDATE inventory_inventoryblob AS blob\n                SET refcount = blob.refcount + counted.refs\n                FROM (\n                    SELECT digest, SUM(refs) AS refs\n                    FROM (\n            SELECT item_blob_id AS digest, 1 AS refs FROM new_items\n            UNION ALL\n            SELECT item_blob_id, -1 FROM old_items\n        ) AS moved\n                    GROUP BY digest\n                    HAVING SUM(refs) <> 0\n                ) AS counted\n                WHERE blob.digest = counted.digest;\n                DELETE FROM inventory_inventoryblobchunk\n                WHERE blob_id IN (\n                    SELECT digest FROM inventory_inventoryblob\n                    WHERE refcount <= 0\n                    AND digest IN (SELECT digest FROM (\n            SELECT item_blob_id AS digest, 1 AS refs FROM new_items\n            UNION ALL\n            SELECT item_blob_id, -1 FROM old_items\n        ) AS moved)\n                );\n                DELETE FROM inventory_inventoryblob\n                WHERE refcount <= 0\n                AND digest IN (SELECT digest FROM (\n            SELECT item_blob_id AS digest, 1 AS refs FROM new_items\n            UNION ALL\n            SELECT item_blob_id, -1 FROM old_items\n        ) AS moved);\n                RETURN NULL;\n            END;\n        ', hash='7fe94a2431e1ed6b779d2784510b2b4f479ddec5', level='STATEMENT', operation='UPDATE', pgid='pgtrigger_count_blob_references_on_update_1be35', referencing='REFERENCING OLD TABLE AS old_items  NEW TABLE AS new_items ', table='inventory_inventory', when='AFTER')),
+        ),
+        pgtrigger.migrations.AddTrigger(
+            model_name='inventory',
+            trigger=pgtrigger.compiler.Trigger(name='count_blob_references_on_delete', sql=pgtrigger.compiler.UpsertTriggerSql(func='\n            BEGIN\n                PERFORM 1\n                FROM inventory_inventoryblob\n                WHERE digest IN (SELECT digest FROM (SELECT item_blob_id AS digest, -1 AS refs FROM old_items) AS moved)\n                ORDER BY digest\n                FOR UPDATE;\n                UPDATE inventory_inventoryblob AS blob\n                SET refcount = blob.refcount + counted.refs\n                FROM (\n                    SELECT digest, SUM(refs) AS refs\n                    FROM (SELECT item_blob_id AS digest, -1 AS refs FROM old_items) AS moved\n                    GROUP BY digest\n                    HAVING SUM(refs) <> 0\n                ) AS counted\n                WHERE blob.digest = counted.digest;\n                DELETE FROM inventory_inventoryblobchunk\n                WHERE blob_id IN (\n                    SELECT digest FROM inventory_inventoryblob\n                    WHERE refcount <= 0\n                    AND digest IN (SELECT digest FROM (SELECT item_blob_id AS digest, -1 AS refs FROM old_items) AS moved)\n                );\n                DELETE FROM inventory_inventoryblob\n                WHERE refcount <= 0\n                AND digest IN (SELECT digest FROM (SELECT item_blob_id AS digest, -1 AS refs FROM old_items) AS moved);\n                RETURN NULL;\n            END;\n        ', hash='ceeb7147e88c35fedb1d0b1bb1729958fabacde1', level='STATEMENT', operation='DELETE', pgid='pgtrigger_count_blob_references_on_delete_1354a', referencing='REFERENCING OLD TABLE AS old_items ', table='inventory_inventory', when='AFTER')),
+        ),
+    ]
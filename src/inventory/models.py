@@ -1,5 +1,305 @@
+import hashlib
+
 import pgtrigger
-from django.db import models
+from django.conf import settings
+from django.db import connection, models, transaction
+
+# Bulk a character can carry; see burden_trigger
+CARRYING_CAPACITY = 11
+
+class InventoryManager(models.Manager):
+
+    def add(self, charname, item_name, qty, upload, consumable = None):
+        """
+        Add qty of item_name to charname's inventory.
+
+        The owner's carried bulk is locked first (see InventoryBurdenManager.
+        lock), then the binary, an upload spooled by BlobUploadHandler, is
+        stored by content along with a lock on the one it replaces (see
+        InventoryBlobManager.ingest_file), and one
+        INSERT ... ON CONFLICT on the owner and item name adds to an existing
+        stack instead, so concurrent adds of the same item cannot duplicate
+        it. The binary is replaced; consumable is only changed when given.
+
+        Returns:
+            int: The id of the item, or None if there is no such character
+
+        Raises:
+            django.db.utils.InternalError: If the owner would be overburdened
+        """
+        meta = self.model._meta
+        table = connection.ops.quote_name(meta.db_table)
+        weight = meta.get_field('item_weight').default
+        if consumable is not None:
+            consumable = meta.get_field('item_consumable').to_python(consumable)
+        with transaction.atomic(), connection.cursor() as cursor:
+            owners = InventoryBurden.objects.lock(charname = charname)
+            if not owners:
+                return None
+            replaced = self.filter(
+                item_owner_id = owners[0],
+                item_name = item_name
+            ).values_list('item_blob_id', flat = True)
+            digest = InventoryBlob.objects.ingest_file(upload, list(replaced))
+            cursor.execute(
+                f"""
+                INSERT INTO {table} (
+                    item_owner_id, item_name, item_qty, item_weight, item_bulk,
+                    item_version, item_consumable, item_blob_id
+                )
+                VALUES (%s, %s, %s, %s, %s, %s, COALESCE(%s, FALSE), %s)
+                ON CONFLICT (item_owner_id, item_name) DO UPDATE SET
+                    item_qty = {table}.item_qty + EXCLUDED.item_qty,
+                    item_bulk = ({table}.item_qty + EXCLUDED.item_qty) * {table}.item_weight,
+                    item_blob_id = EXCLUDED.item_blob_id,
+                    item_consumable = COALESCE(%s, {table}.item_consumable)
+                RETURNING id
+                """,
+                [
+                    owners[0], item_name, qty, weight, qty * weight,
+                    meta.get_field('item_version').default, consumable, digest,
+                    consumable
+                ]
+            )
+            return cursor.fetchone()[0]
+
+    def add_many(self, stacks):
+        """
+        Add many stacks, for any number of owners, in one statement.
+
+        Like add, stacks an owner already holds are added to, but every row
+        goes into a single multi-row INSERT ... ON CONFLICT DO UPDATE, so
+        the burden triggers check each owner once for the whole batch and
+        either all of it is stored or none. Every owner's carried bulk is
+        locked first, as in add. Each distinct binary in the batch is
+        stored once.
+
+        Args:
+            stacks: Dicts of item_owner_id, item_name, item_qty,
+                item_consumable and item_bytestring; at most one per owner
+                and item name
+
+        Raises:
+            django.db.utils.InternalError: If any owner would be overburdened
+        """
+        if not stacks:
+            return
+        meta = self.model._meta
+        table = connection.ops.quote_name(meta.db_table)
+        weight = meta.get_field('item_weight').default
+        version = meta.get_field('item_version').default
+        rows = []
+        params = []
+        with transaction.atomic(), connection.cursor() as cursor:
+            owner_ids = {stack['item_owner_id'] for stack in stacks}
+            InventoryBurden.objects.lock(owner_ids = owner_ids)
+            # Covers every stack replaced, and maybe a few more; locking those is harmless
+            replaced = self.filter(
+                item_owner_id__in = owner_ids,
+                item_name__in = {stack['item_name'] for stack in stacks}
+            ).values_list('item_blob_id', flat = True)
+            digests = InventoryBlob.objects.ingest(
+                *[stack['item_bytestring'] for stack in stacks],
+                replaced = list(replaced)
+            )
+            for stack, digest in zip(stacks, digests):
+                rows.append("(%s, %s, %s, %s, %s, %s, %s, %s)")
+                params.extend([
+                    stack['item_owner_id'], stack['item_name'], stack['item_qty'], weight,
+                    stack['item_qty'] * weight, version, stack['item_consumable'], digest
+                ])
+            cursor.execute(
+                f"""
+                INSERT INTO {table} (
+                    item_owner_id, item_name, item_qty, item_weight, item_bulk,
+                    item_version, item_consumable, item_blob_id
+                )
+                VALUES {", ".join(rows)}
+                ON CONFLICT (item_owner_id, item_name) DO UPDATE SET
+                    item_qty = {table}.item_qty + EXCLUDED.item_qty,
+                    item_bulk = ({table}.item_qty + EXCLUDED.item_qty) * {table}.item_weight,
+                    item_blob_id = EXCLUDED.item_blob_id,
+                    item_consumable = EXCLUDED.item_consumable
+                """,
+                params
+            )
+
+    def transfer(self, giver_id, receiver_id, quantities):
+        """
+        Move items from one character to another in a single transaction.
+
+        Both characters' carried bulk is locked first (see
+        InventoryBurdenManager.lock), then the binaries of the stacks
+        involved (see InventoryBlobManager.lock) and the giver's stacks in
+        id order. The receiver's stacks are upserted as copies of the
+        giver's in one statement, sharing their binaries by digest, and the
+        giver's reduced in another, which lets decrement_item_qty_trigger
+        remove the stacks given away.
+
+        Args:
+            quantities: Maps item names to the amount of each to move
+
+        Raises:
+            Inventory.DoesNotExist: If the giver holds none of an item
+            ValueError: If the giver holds less of an item than asked for
+            django.db.utils.InternalError: If the receiver would be overburdened
+        """
+        meta = self.model._meta
+        table = connection.ops.quote_name(meta.db_table)
+        with transaction.atomic():
+            InventoryBurden.objects.lock(owner_ids = {giver_id, receiver_id})
+            InventoryBlob.objects.lock(
+                self.filter(
+                    item_owner_id__in = [giver_id, receiver_id],
+                    item_name__in = list(quantities)
+                ).values('item_blob_id')
+            )
+            stacks = list(self.select_for_update().filter(
+                item_owner_id = giver_id,
+                item_name__in = list(quantities)
+            ).order_by('id').only(
+                'item_name', 'item_qty', 'item_weight', 'item_version',
+                'item_consumable', 'item_blob'
+            ))
+            held = {stack.item_name: stack for stack in stacks}
+            for item_name, qty in quantities.items():
+                if item_name not in held:
+                    raise self.model.DoesNotExist(f"{item_name} is not held")
+                if held[item_name].item_qty < qty:
+                    raise ValueError(f"Not enough {item_name} to give")
+
+            rows = []
+            params = []
+            for stack in stacks:
+                qty = quantities[stack.item_name]
+                rows.append("(%s, %s, %s, %s, %s, %s, %s, %s)")
+                params.extend([
+                    receiver_id, stack.item_name, qty, stack.item_weight,
+                    qty * stack.item_weight, stack.item_version,
+                    stack.item_consumable, stack.item_blob_id
+                ])
+            with connection.cursor() as cursor:
+                # TODO: Consider what happens if they're not the same binary; probably reject
+                cursor.execute(
+                    f"""
+                    INSERT INTO {table} (
+                        item_owner_id, item_name, item_qty, item_weight, item_bulk,
+                        item_version, item_consumable, item_blob_id
+                    )
+                    VALUES {", ".join(rows)}
+                    ON CONFLICT (item_owner_id, item_name) DO UPDATE SET
+                        item_qty = {table}.item_qty + EXCLUDED.item_qty,
+                        item_bulk = ({table}.item_qty + EXCLUDED.item_qty) * EXCLUDED.item_weight,
+                        item_weight = EXCLUDED.item_weight,
+                        item_version = EXCLUDED.item_version,
+                        item_consumable = EXCLUDED.item_consumable,
+                        item_blob_id = EXCLUDED.item_blob_id
+                    """,
+                    params
+                )
+            given = models.Case(*[
+                models.When(id = stack.id, then = models.Value(quantities[stack.item_name]))
+                for stack in stacks
+            ], output_field = models.FloatField())
+            self.filter(id__in = [stack.id for stack in stacks]).update(
+                item_qty = models.F('item_qty') - given,
+                item_bulk = (models.F('item_qty') - given) * models.F('item_weight')
+            )
+
+def burden_trigger(operation, referencing, moved, check = True):
+    """
+    A statement-level trigger keeping InventoryBurden in step with the rows
+    a statement changed, as listed by the moved query (owner_id, bulk and
+    weight per changed row, bulk negative for bulk taken away).
+
+    However many rows the statement touched, each owner's total is upserted
+    once, in owner order, which also locks it so that concurrent changes to
+    one inventory are checked in turn. With check set, the statement is
+    refused if it added bulk to an owner who can then no longer carry the
+    heaviest of those items.
+    """
+    verdict = f"""
+        -- Only picking things up can overburden; dropping them always works
+        IF EXISTS (
+            SELECT 1
+            FROM ({moved}) AS moved
+            JOIN inventory_inventoryburden AS burden USING (owner_id)
+            GROUP BY owner_id, burden.carried_bulk
+            HAVING SUM(moved.bulk) > 0
+            AND MAX(moved.weight) + burden.carried_bulk > {CARRYING_CAPACITY}
+        ) THEN
+            RAISE EXCEPTION 'overburdened';
+        END IF;
+    """ if check else ""
+    return pgtrigger.Trigger(
+        name=f'track_inventory_burden_on_{str(operation).lower()}',
+        level=pgtrigger.Statement,
+        operation=operation,
+        when=pgtrigger.After,
+        referencing=referencing,
+        func=f"""
+            BEGIN
+                INSERT INTO inventory_inventoryburden (owner_id, carried_bulk)
+                SELECT owner_id, SUM(bulk)
+                FROM ({moved}) AS moved
+                GROUP BY owner_id
+                HAVING SUM(bulk) <> 0
+                ORDER BY owner_id
+                ON CONFLICT (owner_id) DO UPDATE
+                SET carried_bulk = inventory_inventoryburden.carried_bulk + EXCLUDED.carried_bulk;
+                {verdict}
+                RETURN NULL;
+            END;
+        """
+    )
+
+def reference_trigger(operation, referencing, moved):
+    """
+    A statement-level trigger counting references to InventoryBlob from the
+    rows a statement changed, as listed by the moved query (digest and
+    refs, +1 for a reference made and -1 for one dropped).
+
+    The affected blobs are locked in digest order, their counts adjusted
+    once per blob, and blobs nobody refers to any more are deleted with
+    their chunks. A blob
+    being ingested is locked by its ingest, so it is not collected before
+    the row referring to it is written.
+    """
+    return pgtrigger.Trigger(
+        name=f'count_blob_references_on_{str(operation).lower()}',
+        level=pgtrigger.Statement,
+        operation=operation,
+        when=pgtrigger.After,
+        referencing=referencing,
+        func=f"""
+            BEGIN
+                PERFORM 1
+                FROM inventory_inventoryblob
+                WHERE digest IN (SELECT digest FROM ({moved}) AS moved)
+                ORDER BY digest
+                FOR UPDATE;
+                UPDATE inventory_inventoryblob AS blob
+                SET refcount = blob.refcount + counted.refs
+                FROM (
+                    SELECT digest, SUM(refs) AS refs
+                    FROM ({moved}) AS moved
+                    GROUP BY digest
+                    HAVING SUM(refs) <> 0
+                ) AS counted
+                WHERE blob.digest = counted.digest;
+                DELETE FROM inventory_inventoryblobchunk
+                WHERE blob_id IN (
+                    SELECT digest FROM inventory_inventoryblob
+                    WHERE refcount <= 0
+                    AND digest IN (SELECT digest FROM ({moved}) AS moved)
+                );
+                DELETE FROM inventory_inventoryblob
+                WHERE refcount <= 0
+                AND digest IN (SELECT digest FROM ({moved}) AS moved);
+                RETURN NULL;
+            END;
+        """
+    )
 
 @pgtrigger.register(
     pgtrigger.Trigger(
@@ -17,25 +317,66 @@ from django.db import models
             END;
         """
     ),
-    pgtrigger.Trigger(
-        name='detect_inventory_overburden',
-        level=pgtrigger.Row,
-        operation=pgtrigger.Update,
-        when=pgtrigger.After,
-        func="""
-            DECLARE
-                volume int;
-            BEGIN
-                volume := NEW.item_weight + (SELECT SUM(item_bulk) FROM inventory_inventory WHERE item_owner_id = NEW.item_owner_id);
-                IF volume > 11 THEN
-                    RAISE EXCEPTION 'overburdened';
-                END IF;
-                RETURN NEW;
-            END;
+    burden_trigger(
+        pgtrigger.Insert,
+        pgtrigger.Referencing(new='new_items'),
+        """
+            SELECT item_owner_id AS owner_id, item_bulk AS bulk, item_weight AS weight
+            FROM new_items
+        """
+    ),
+    burden_trigger(
+        pgtrigger.Update,
+        pgtrigger.Referencing(old='old_items', new='new_items'),
+        """
+            SELECT item_owner_id AS owner_id, item_bulk AS bulk, item_weight AS weight
+            FROM new_items
+            UNION ALL
+            SELECT item_owner_id, -item_bulk, NULL
+            FROM old_items
+        """
+    ),
+    burden_trigger(
+        pgtrigger.Delete,
+        pgtrigger.Referencing(old='old_items'),
         """
+            SELECT item_owner_id AS owner_id, -item_bulk AS bulk, NULL::double precision AS weight
+            FROM old_items
+        """,
+        check = False
+    ),
+    reference_trigger(
+        pgtrigger.Insert,
+        pgtrigger.Referencing(new='new_items'),
+        "SELECT item_blob_id AS digest, 1 AS refs FROM new_items"
+    ),
+    reference_trigger(
+        pgtrigger.Update,
+        pgtrigger.Referencing(old='old_items', new='new_items'),
+        """
+            SELECT item_blob_id AS digest, 1 AS refs FROM new_items
+            UNION ALL
+            SELECT item_blob_id, -1 FROM old_items
+        """
+    ),
+    reference_trigger(
+        pgtrigger.Delete,
+        pgtrigger.Referencing(old='old_items'),
+        "SELECT item_blob_id AS digest, -1 AS refs FROM old_items"
     )
 )
 class Inventory(models.Model):
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields = ["item_owner", "item_name"],
+                name = "inventory_owner_item_unique"
+            )
+        ]
+
+    objects = InventoryManager()
+
     item_owner = models.ForeignKey(
         'omnipresence.OmnipresenceModel',
         on_delete = models.DO_NOTHING,
@@ -47,7 +388,10 @@ class Inventory(models.Model):
     item_bulk = models.FloatField(default=1.0)
     item_version = models.CharField(max_length = 255, default = "1.0.0")
     item_consumable = models.BooleanField(default = False)
-    item_bytestring = models.BinaryField(default = b'\x08', editable = True)
+    item_blob = models.ForeignKey(
+        'inventory.InventoryBlob',
+        on_delete = models.PROTECT
+    )
 
     def __str__(self):
         return self.item_name
@@ -58,3 +402,232 @@ class Inventory(models.Model):
         for field in fields:
             result[field.name] = getattr(self, field.name)
         return result
+
+class InventoryBurdenManager(models.Manager):
+
+    def lock(self, owner_ids = (), charname = None):
+        """
+        Lock the carried-bulk rows of the characters with the given ids and
+        of the one called charname, creating any that are missing.
+
+        Every write to inventories calls this before touching any item, so
+        writers take their locks in the same order, owners in id order and
+        then items; the burden triggers lock these rows again later, which
+        would otherwise let an add and a transfer each hold what the other
+        waits for. Call it inside the writer's transaction.
+
+        Returns:
+            list: The ids of the characters that exist, in id order
+        """
+        burden = connection.ops.quote_name(self.model._meta.db_table)
+        owners = connection.ops.quote_name(
+            self.model._meta.get_field('owner').related_model._meta.db_table
+        )
+        owner_ids = list(owner_ids)
+        matches = ["owner.charname = %s"]
+        if owner_ids:
+            matches.append(f"owner.id IN ({', '.join(['%s'] * len(owner_ids))})")
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO {burden} (owner_id, carried_bulk)
+                SELECT owner.id, 0
+                FROM {owners} AS owner
+                WHERE {" OR ".join(matches)}
+                ORDER BY owner.id
+                ON CONFLICT (owner_id) DO UPDATE
+                SET carried_bulk = {burden}.carried_bulk
+                RETURNING owner_id
+                """,
+                [charname, *owner_ids]
+            )
+            return sorted(row[0] for row in cursor.fetchall())
+
+class InventoryBurden(models.Model):
+    """
+    Total bulk each character carries, maintained by the burden triggers
+    so the overburden check and capacity reports need no SUM().
+    """
+    objects = InventoryBurdenManager()
+
+    owner = models.OneToOneField(
+        'omnipresence.OmnipresenceModel',
+        on_delete = models.DO_NOTHING,
+        primary_key = True,
+        related_name = 'burden'
+    )
+    carried_bulk = models.FloatField(default = 0.0)
+
+    def remaining(self):
+        return CARRYING_CAPACITY - self.carried_bulk
+
+class InventoryBlobManager(models.Manager):
+
+    def claim(self, sizes, chunk_size, replaced = ()):
+        """
+        Make sure a blob exists for each digest in sizes, a dict of digest
+        to size, and return the digests whose chunks still have to be
+        written, chunk_size bytes each.
+
+        The blobs are upserted in digest order. ON CONFLICT DO UPDATE locks
+        those already stored so that they cannot be collected before the
+        caller's transaction refers to them; call this inside that
+        transaction and write the chunks in it too. A stored blob has
+        all its chunks, so only new ones are returned.
+
+        replaced names stored blobs the caller's write will stop referring
+        to. They are locked in the same pass, so every blob the reference
+        triggers count is already locked, in digest order (see lock).
+        """
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        rows = []
+        params = []
+        # Replaced blobs are stored, so their placeholder size is never written
+        for digest, size in sorted({**dict.fromkeys(replaced, 0), **sizes}.items()):
+            rows.append("(%s, %s, %s, 0)")
+            params.extend([digest, size, chunk_size])
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO {table} (digest, size, chunk_size, refcount)
+                VALUES {", ".join(rows)}
+                ON CONFLICT (digest) DO UPDATE SET refcount = {table}.refcount
+                """,
+                params
+            )
+        # An empty binary has no chunks to write
+        wanted = [digest for digest, size in sizes.items() if size]
+        if not wanted:
+            return []
+        written = set(
+            InventoryBlobChunk.objects.filter(
+                blob_id__in = wanted, seq = 0
+            ).values_list('blob_id', flat = True)
+        )
+        return [digest for digest in wanted if digest not in written]
+
+    def ingest(self, *binaries, replaced = ()):
+        """
+        Store binaries by content and return their digests, in order.
+
+        Each distinct binary is stored once (see claim, which also locks
+        the replaced blobs); the chunks of the new ones go in a single
+        INSERT.
+
+        Returns:
+            list: The SHA-256 hex digest of each binary
+        """
+        binaries = [bytes(binary) for binary in binaries]
+        digests = [hashlib.sha256(binary).hexdigest() for binary in binaries]
+        distinct = dict(zip(digests, binaries))
+        chunk_size = settings.INVENTORY_BLOB_CHUNK_SIZE
+        missing = self.claim(
+            {digest: len(binary) for digest, binary in distinct.items()},
+            chunk_size,
+            replaced
+        )
+        InventoryBlobChunk.objects.bulk_create([
+            InventoryBlobChunk(
+                blob_id = digest,
+                seq = seq,
+                data = distinct[digest][offset:offset + chunk_size]
+            )
+            for digest in missing
+            for seq, offset in enumerate(range(0, len(distinct[digest]), chunk_size))
+        ])
+        return digests
+
+    def ingest_file(self, upload, replaced = ()):
+        """
+        Store an upload spooled by BlobUploadHandler and return its digest.
+
+        The upload is read back a chunk at a time, each written by its own
+        INSERT, so memory stays at one chunk however large it is. Nothing
+        is written if the same binary is stored already (see claim, which
+        also locks the replaced blobs).
+        """
+        chunk_size = settings.INVENTORY_BLOB_CHUNK_SIZE
+        if self.claim({upload.digest: upload.size}, chunk_size, replaced):
+            upload.seek(0)
+            for seq, data in enumerate(iter(lambda: upload.read(chunk_size), b"")):
+                InventoryBlobChunk.objects.create(
+                    blob_id = upload.digest,
+                    seq = seq,
+                    data = data
+                )
+        return upload.digest
+
+    def lock(self, digests):
+        """
+        Lock stored blobs in digest order, for writes that only move
+        references between them (see InventoryManager.transfer).
+
+        The reference triggers lock the blobs each statement counts, in
+        digest order; a write of several statements, or one firing both
+        the insert and update triggers, would otherwise take those locks
+        in several passes and could deadlock with another such write.
+        """
+        list(self.select_for_update().filter(
+            digest__in = digests
+        ).order_by('digest').values_list('digest', flat = True))
+
+    def read(self, digest, start, stop, chunk_size):
+        """
+        Yield bytes start to stop of a blob stored in chunk_size chunks.
+
+        Each chunk the range covers is read by its own query, so at most
+        one chunk is held at once. A blob never changes under its digest,
+        so the chunks always fit together, but if it is collected midway
+        the reading stops short.
+        """
+        for seq in range(start // chunk_size, (stop + chunk_size - 1) // chunk_size):
+            data = InventoryBlobChunk.objects.filter(
+                blob_id = digest,
+                seq = seq
+            ).values_list('data', flat = True).first()
+            if data is None:
+                return
+            offset = seq * chunk_size
+            yield bytes(data)[max(start - offset, 0):stop - offset]
+
+class InventoryBlob(models.Model):
+    """
+    An item binary stored once however many stacks use it, keyed by its
+    SHA-256 digest and kept in chunk_size pieces (InventoryBlobChunk);
+    refcount is kept by the count_blob_references triggers.
+    """
+    digest = models.CharField(max_length = 64, primary_key = True)
+    size = models.IntegerField()
+    chunk_size = models.IntegerField()
+    refcount = models.IntegerField(default = 0)
+
+    objects = InventoryBlobManager()
+
+    @property
+    def data(self):
+        # Reads every chunk; prefetch 'chunks' when loading many blobs
+        return b"".join(bytes(chunk.data) for chunk in self.chunks.all())
+
+class InventoryBlobChunk(models.Model):
+    """
+    Bytes seq * chunk_size onwards of a blob, chunk_size of them but for
+    the last; written once, by the transaction that stores the blob.
+    """
+    # The unique constraint leads with blob, so it needs no index of its own
+    blob = models.ForeignKey(
+        InventoryBlob,
+        on_delete = models.CASCADE,
+        related_name = 'chunks',
+        db_index = False
+    )
+    seq = models.IntegerField()
+    data = models.BinaryField()
+
+    class Meta:
+        ordering = ['seq']
+        constraints = [
+            models.UniqueConstraint(
+                fields = ['blob', 'seq'],
+                name = 'inventory_blob_chunk_unique'
+            )
+        ]
@@ -6,9 +6,18 @@ from .models import Inventory
 
 class InventorySerializer(serializers.ModelSerializer):
 
+    # Binaries live in InventoryBlob; keep sending them inline as before
+    item_bytestring = serializers.SerializerMethodField()
+
     class Meta:
         model = Inventory
-        fields = '__all__'
+        fields = [
+            'id', 'item_name', 'item_qty', 'item_weight', 'item_bulk',
+            'item_version', 'item_consumable', 'item_bytestring', 'item_owner'
+        ]
+
+    def get_item_bytestring(self, item):
+        return base64.b64encode(item.item_blob.data).decode('ascii')
 
     def validate_item_structure(self, item):
         try:
@@ -1,3 +1,246 @@
-from django.test import TestCase
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db.utils import InternalError
+from django.test import SimpleTestCase, TestCase, override_settings
 
-# Create your tests here.
+from core.tokens import issue_session_token
+
+from inventory.models import CARRYING_CAPACITY, Inventory, InventoryBlob, InventoryBlobChunk, InventoryBurden
+from inventory.views import byte_range
+from omnipresence.models import OmnipresenceModel
+
+
+class ByteRangeTests(SimpleTestCase):
+
+    def test_ranges(self):
+        cases = {
+            "bytes=0-9": (0, 10),
+            "bytes=10-": (10, 100),
+            "bytes=-5": (95, 100),
+            "bytes=-500": (0, 100),
+            "bytes=90-500": (90, 100),
+            " bytes = 1 - 2 ": (1, 3),
+        }
+        for header, wanted in cases.items():
+            with self.subTest(header = header):
+                self.assertEqual(byte_range(header, 100), wanted)
+
+    def test_unusable_headers_send_everything(self):
+        for header in ("", "bytes=-", "bytes=5-2", "bytes=0-1,4-5", "items=0-9", "bytes=a-b"):
+            with self.subTest(header = header):
+                self.assertIsNone(byte_range(header, 100))
+
+    def test_unsatisfiable_ranges(self):
+        for header, size in (("bytes=100-", 100), ("bytes=-0", 100), ("bytes=-1", 0), ("bytes=0-", 0)):
+            with self.subTest(header = header, size = size):
+                with self.assertRaises(ValueError):
+                    byte_range(header, size)
+
+
+class InventoryTestCase(TestCase):
+
+    def setUp(self):
+        self.ann = OmnipresenceModel.objects.create(username = "ann", charname = "ann", working_dir = "/")
+        self.bob = OmnipresenceModel.objects.create(username = "bob", charname = "bob", working_dir = "/")
+
+    def stack(self, owner, item_name, item_qty, item_bytestring = b"binary"):
+        return {
+            "item_owner_id": owner.id,
+            "item_name": item_name,
+            "item_qty": item_qty,
+            "item_consumable": False,
+            "item_bytestring": item_bytestring
+        }
+
+    def carried(self, owner):
+        return InventoryBurden.objects.filter(owner = owner).values_list(
+            "carried_bulk", flat = True
+        ).first() or 0.0
+
+    def held(self, owner):
+        return dict(Inventory.objects.filter(item_owner = owner).values_list("item_name", "item_qty"))
+
+
+class AddInventoryViewTests(InventoryTestCase):
+
+    def add(self, binary = b"binary", **data):
+        data.setdefault("item_owner", "ann")
+        return self.client.post(
+            "/v1/inventory/add/",
+            {**data, "item_binary": SimpleUploadedFile("item", binary)},
+            HTTP_USER = "ann",
+            HTTP_X_SESSION_TOKEN = issue_session_token("ann")
+        )
+
+    def test_required_fields(self):
+        for data in (
+            {},
+            {"item_name": ""},
+            {"item_name": "x" * 256},
+            {"item_name": "rock", "item_owner": ""}
+        ):
+            with self.subTest(data = data):
+                self.assertEqual(self.add(**data).status_code, 400)
+        self.assertEqual(self.held(self.ann), {})
+
+
+    def test_adding_again_stacks_in_place(self):
+        self.assertEqual(self.add(item_name = "rock", item_qty = 2).status_code, 200)
+        first = Inventory.objects.get()
+        self.assertEqual(self.add(item_name = "rock", item_qty = 3).status_code, 200)
+        stack = Inventory.objects.get()
+        self.assertEqual(stack.id, first.id)
+        self.assertEqual(stack.item_qty, 5)
+        self.assertEqual(stack.item_bulk, 5)
+        self.assertEqual(self.carried(self.ann), 5)
+
+    def test_stacking_keeps_blob_references_right(self):
+        self.add(b"same", item_name = "rock")
+        self.add(b"same", item_name = "rock")
+        self.assertEqual(list(InventoryBlob.objects.values_list("refcount", flat = True)), [1])
+        # A new binary replaces the old one, which nothing refers to any more
+        self.add(b"changed", item_name = "rock")
+        blob = InventoryBlob.objects.get()
+        self.assertEqual(blob.refcount, 1)
+        self.assertEqual(blob.data, b"changed")
+        self.assertEqual(Inventory.objects.get().item_blob_id, blob.digest)
+
+    @override_settings(INVENTORY_UPLOAD_MAX_SIZE = 8)
+    def test_upload_over_the_limit_is_refused(self):
+        response = self.add(b"123456789", item_name = "rock")
+        self.assertEqual(response.status_code, 413)
+        self.assertEqual(self.held(self.ann), {})
+        self.assertFalse(InventoryBlob.objects.exists())
+        self.assertEqual(self.add(b"12345678", item_name = "rock").status_code, 200)
+
+    @override_settings(INVENTORY_BLOB_CHUNK_SIZE = 4)
+    def test_upload_round_trips_through_chunks(self):
+        binary = bytes(range(10))
+        self.assertEqual(self.add(binary, item_name = "rock").status_code, 200)
+        blob = InventoryBlob.objects.get()
+        self.assertEqual(blob.size, 10)
+        self.assertEqual(
+            [bytes(data) for data in blob.chunks.values_list("data", flat = True)],
+            [binary[0:4], binary[4:8], binary[8:10]]
+        )
+        response = self.client.get(
+            "/v1/inventory/binary",
+            {"charname": "ann", "item_name": "rock"},
+            HTTP_USER = "ann",
+            HTTP_X_SESSION_TOKEN = issue_session_token("ann")
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), binary)
+        # The chunks go with the blob once nothing refers to it
+        Inventory.objects.filter(item_owner = self.ann).delete()
+        self.assertFalse(InventoryBlob.objects.exists())
+        self.assertFalse(InventoryBlobChunk.objects.exists())
+
+class BurdenTriggerTests(InventoryTestCase):
+
+    def test_burden_follows_every_statement(self):
+        # One INSERT for several owners
+        Inventory.objects.add_many([
+            self.stack(self.ann, "rock", 3),
+            self.stack(self.ann, "gem", 2),
+            self.stack(self.bob, "rock", 4)
+        ])
+        self.assertEqual(self.carried(self.ann), 5)
+        self.assertEqual(self.carried(self.bob), 4)
+        # One UPDATE of several rows
+        Inventory.objects.filter(item_owner = self.ann).update(item_qty = 1, item_bulk = 1)
+        self.assertEqual(self.carried(self.ann), 2)
+        # One DELETE of several rows
+        Inventory.objects.filter(item_owner = self.ann).delete()
+        self.assertEqual(self.carried(self.ann), 0)
+        self.assertEqual(self.carried(self.bob), 4)
+
+    def test_overburdening_insert_stores_nothing(self):
+        with self.assertRaises(InternalError):
+            Inventory.objects.add_many([
+                self.stack(self.ann, "rock", 6),
+                self.stack(self.ann, "gem", CARRYING_CAPACITY - 5)
+            ])
+        self.assertEqual(self.held(self.ann), {})
+        self.assertEqual(self.carried(self.ann), 0)
+
+
+class ReferenceTriggerTests(InventoryTestCase):
+
+    def test_shared_binary_is_stored_once_and_collected_with_its_last_stack(self):
+        Inventory.objects.add_many([
+            self.stack(self.ann, "rock", 1, b"0123456789"),
+            self.stack(self.bob, "rock", 1, b"0123456789")
+        ])
+        blob = InventoryBlob.objects.get()
+        self.assertEqual(blob.refcount, 2)
+        self.assertEqual(blob.size, 10)
+
+        Inventory.objects.filter(item_owner = self.ann).delete()
+        self.assertEqual(InventoryBlob.objects.get().refcount, 1)
+        Inventory.objects.filter(item_owner = self.bob).delete()
+        self.assertFalse(InventoryBlob.objects.exists())
+
+    def test_replaced_binary_is_collected(self):
+        Inventory.objects.add_many([self.stack(self.ann, "rock", 1, b"old")])
+        Inventory.objects.add_many([self.stack(self.ann, "rock", 1, b"new")])
+        self.assertEqual(
+            list(InventoryBlob.objects.values_list("refcount", flat = True)),
+            [1]
+        )
+        self.assertEqual(InventoryBlob.objects.get().data, b"new")
+
+
+class BlobReadTests(InventoryTestCase):
+
+    @override_settings(INVENTORY_BLOB_CHUNK_SIZE = 4)
+    def test_read_returns_only_the_range(self):
+        Inventory.objects.add_many([self.stack(self.ann, "rock", 1, b"0123456789")])
+        blob = InventoryBlob.objects.get()
+        self.assertEqual(InventoryBlobChunk.objects.filter(blob = blob).count(), 3)
+        for start, stop in ((0, 10), (3, 9), (4, 8), (9, 10)):
+            with self.subTest(start = start, stop = stop):
+                self.assertEqual(
+                    b"".join(InventoryBlob.objects.read(blob.digest, start, stop, 4)),
+                    b"0123456789"[start:stop]
+                )
+
+
+class TransferTests(InventoryTestCase):
+
+    def setUp(self):
+        super().setUp()
+        Inventory.objects.add_many([
+            self.stack(self.ann, "rock", 5, b"rock"),
+            self.stack(self.ann, "gem", 2, b"gem"),
+            self.stack(self.bob, "stone", 6, b"stone")
+        ])
+
+    def assertUnchanged(self):
+        self.assertEqual(self.held(self.ann), {"rock": 5, "gem": 2})
+        self.assertEqual(self.held(self.bob), {"stone": 6})
+        self.assertEqual(self.carried(self.ann), 7)
+        self.assertEqual(self.carried(self.bob), 6)
+
+    def test_items_move_and_emptied_stacks_go(self):
+        Inventory.objects.transfer(self.ann.id, self.bob.id, {"rock": 2, "gem": 2})
+        self.assertEqual(self.held(self.ann), {"rock": 3})
+        self.assertEqual(self.held(self.bob), {"stone": 6, "rock": 2, "gem": 2})
+        self.assertEqual(self.carried(self.ann), 3)
+        self.assertEqual(self.carried(self.bob), 10)
+        # The emptied stack dropped its reference to the gem's binary
+        self.assertEqual(InventoryBlob.objects.get(inventory__item_name = "gem").refcount, 1)
+
+    def test_overburdening_transfer_rolls_back_completely(self):
+        with self.assertRaises(InternalError):
+            Inventory.objects.transfer(self.ann.id, self.bob.id, {"rock": 3, "gem": 2})
+        self.assertUnchanged()
+
+    def test_missing_item_moves_nothing(self):
+        with self.assertRaises(Inventory.DoesNotExist):
+            Inventory.objects.transfer(self.ann.id, self.bob.id, {"rock": 1, "sword": 1})
+        self.assertUnchanged()
+
+    def test_short_item_moves_nothing(self):
+        with self.assertRaises(ValueError):
+            Inventory.objects.transfer(self.ann.id, self.bob.id, {"rock": 1, "gem": 3})
+        self.assertUnchanged()
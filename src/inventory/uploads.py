@@ -0,0 +1,45 @@
+import hashlib
+
+from django.conf import settings
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+
+
+class UploadTooLarge(Exception):
+
+    def __init__(self, max_size):
+        super().__init__(f"Uploads are limited to {max_size} bytes")
+        self.max_size = max_size
+
+
+class BlobUploadHandler(TemporaryFileUploadHandler):
+    """
+    Spools uploaded files to disk, hashing them as they arrive.
+
+    Only the chunk being received is held in memory, however large the
+    file. When it is complete the file carries its SHA-256 hex digest as
+    digest, ready for InventoryBlobManager.ingest_file. A file is refused
+    with UploadTooLarge as soon as it passes max_size bytes, without
+    reading the rest of the request.
+    """
+
+    def __init__(self, request = None, max_size = None):
+        super().__init__(request)
+        self.max_size = settings.INVENTORY_UPLOAD_MAX_SIZE if max_size is None else max_size
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.hash = hashlib.sha256()
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > self.max_size:
+            self.file.close()
+            raise UploadTooLarge(self.max_size)
+        self.hash.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        upload = super().file_complete(file_size)
+        upload.digest = self.hash.hexdigest()
+        return upload
@@ -1,20 +1,28 @@
+import re
 import json
+import math
 import requests
 import logging
 import omnipresence
 
-from django.http import HttpResponse
+from django.core.exceptions import ValidationError
+from django.db.models import F
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.http import parse_etags, quote_etag
 from rest_framework.views import APIView
 from rest_framework.generics import GenericAPIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.mixins import UpdateModelMixin
-from .models import Inventory
+from .models import Inventory, InventoryBlob, InventoryBurden, CARRYING_CAPACITY
 from .serializers import InventorySerializer
+from .uploads import BlobUploadHandler, UploadTooLarge
+from core.streaming import streamed
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
 from rest_framework import permissions
-from django.db.utils import InternalError as PostgresException
+from django.db import transaction
+from django.db.utils import InternalError as PostgresException, OperationalError
 
 # Set up the logger
 logger = logging.getLogger(__name__)
@@ -31,56 +39,220 @@ schema_view = get_schema_view(
     permission_classes=(permissions.AllowAny,),
 )
 
+def quantity(value):
+    """
+    Read an item quantity, which must be a finite number above zero.
+
+    Raises:
+        ValueError: If it is not one
+    """
+    qty = float(value)
+    if not (math.isfinite(qty) and qty > 0):
+        raise ValueError(f"Not a quantity: {value}")
+    return qty
+
+def busy():
+    # Lock waits that failed, such as a deadlock Postgres broke; nothing was written
+    return HttpResponse(
+        json.dumps({'error': 'The inventory is busy; try again.'}),
+        status = 503,
+        content_type = 'application/json'
+    )
+
 class AddInventoryView(APIView):
 
+    """
+       The item binary is streamed in: hashed and spooled to disk as it
+       arrives, refused with a 413 once past INVENTORY_UPLOAD_MAX_SIZE,
+       then written a chunk at a time (see BlobUploadHandler). Queries, in
+       one transaction: locking the owner's carried bulk by charname,
+       finding the binary the item had, storing the new one by its digest
+       (2, plus one per
+       INVENTORY_BLOB_CHUNK_SIZE bytes unless already stored) and an upsert
+       that either creates the item or adds to the existing stack (see
+       InventoryManager.add).
+    """
+
+    def initialize_request(self, request, *args, **kwargs):
+        # Upload handlers can only be swapped before the body is read
+        request.upload_handlers = [BlobUploadHandler(request)]
+        return super().initialize_request(request, *args, **kwargs)
+
     def post(self, request, *args, **kwargs):
-        item_owner_record = omnipresence.models.OmnipresenceModel.objects.get(
-            charname = request.data.get('item_owner')
-        )
-        item_owner_id = getattr(item_owner_record, 'id')
-        item, created = Inventory.objects.get_or_create(
-            item_owner_id = item_owner_id,
-            item_name = request.data.get("item_name")
-        )
-        setattr(item, 'item_consumable', request.data.get('item_consumable'))
-        setattr(item, 'item_bytestring', request.FILES['item_binary'].read())
-        if not created: # In the case that the record exists; should be updated
-            # Update quantity and space (bulk); TODO: need to figure out how to handle versioning
-            qty = getattr(item, 'item_qty') + float(request.data.get('item_qty'))
-            setattr(item, 'item_qty', qty)
-            # TODO: This is really a trigger?
-            setattr(item, 'item_bulk', qty * getattr(item, 'item_weight'))
-            # Save modified item to database
         try:
-            item.save()
+            upload = request.FILES.get('item_binary')
+        except UploadTooLarge as e:
+            return HttpResponse(
+                json.dumps({'error': str(e)}),
+                status = 413,
+                content_type = 'application/json'
+            )
+        if upload is None:
+            return HttpResponse(
+                json.dumps({'error': 'Send the item as an item_binary file'}),
+                status = 400,
+                content_type = 'application/json'
+            )
+        item_owner = request.data.get('item_owner')
+        try:
+            if not item_owner:
+                raise ValidationError('item_owner is required')
+            # Refuses a missing, blank or over-long name before it reaches the upsert
+            item_name = Inventory._meta.get_field('item_name').clean(
+                request.data.get('item_name'), None
+            )
+        except ValidationError as e:
+            return HttpResponse(
+                json.dumps({'error': e.messages}),
+                status = 400,
+                content_type = 'application/json'
+            )
+        try:
+            qty = quantity(request.data.get('item_qty', 1))
+        except (TypeError, ValueError):
+            return HttpResponse(
+                json.dumps({'error': 'item_qty must be a number above zero'}),
+                status = 400,
+                content_type = 'application/json'
+            )
+        try:
+            # TODO: need to figure out how to handle versioning
+            item_id = Inventory.objects.add(
+                item_owner,
+                item_name,
+                qty,
+                upload,
+                consumable = request.data.get('item_consumable')
+            )
+        except ValidationError as e:
+            return HttpResponse(
+                json.dumps({'error': e.messages}),
+                status = 400,
+                content_type = 'application/json'
+            )
         except PostgresException as e:
             return HttpResponse(
                 json.dumps({'error': 'You are overburdened! Remove items from your inventory.'}),
                 status = 409
             )
+        except OperationalError:
+            return busy()
+        if item_id is None:
+            return HttpResponse(
+                json.dumps({'error': 'Character not found'}),
+                status = 404,
+                content_type = 'application/json'
+            )
         return HttpResponse(
             status = 200
         )
-        return HttpResponse(status = 400)
 
-class ReduceInventoryView(GenericAPIView, UpdateModelMixin):
+class BulkAddInventoryView(APIView):
 
-    def patch(self, request, *args, **kwargs):
-        item_owner_record = omnipresence.models.OmnipresenceModel.objects.get(
-            charname = request.data.get('item_owner')
+    """
+       Adds many items for any number of characters in one request, as JSON:
+       {"items": [{"item_owner", "item_name", "item_qty", "item_consumable",
+       "item_binary" (hex)}, ...]}. Repeats of an owner's item are added up;
+       unlike add/, item_consumable (default false) is always written, as
+       the binary is.
+       All or nothing: an unknown character is a 404 and an overburdened
+       one a 409. Queries: up to 7, one for the owners' ids, one locking
+       their carried bulk, one finding the binaries replaced, up to three
+       storing every distinct binary and one upsert for every item (see
+       InventoryManager.add_many).
+    """
+
+    max_items = 5000
+
+    def post(self, request, *args, **kwargs):
+        try:
+            items = request.data['items']
+            if not 0 < len(items) <= self.max_items:
+                raise ValueError(len(items))
+            stacks = {}
+            for item in items:
+                key = (item['item_owner'], item['item_name'])
+                if not all(key):
+                    raise ValueError(item)
+                qty = quantity(item.get('item_qty', 1))
+                stack = stacks.setdefault(key, {'item_qty': 0})
+                stack['item_qty'] += qty
+                stack['item_bytestring'] = bytes.fromhex(item['item_binary'])
+                stack['item_consumable'] = Inventory._meta.get_field(
+                    'item_consumable'
+                ).to_python(item.get('item_consumable', False))
+        except (TypeError, ValueError, KeyError, ValidationError):
+            return HttpResponse(
+                json.dumps({
+                    'error': f'Send 1 to {self.max_items} items, each with item_owner, '
+                             'item_name, item_qty and a hex item_binary'
+                }),
+                status = 400,
+                content_type = 'application/json'
+            )
+
+        charnames = {charname for charname, _ in stacks}
+        owners = dict(
+            omnipresence.models.OmnipresenceModel.objects.filter(
+                charname__in = charnames
+            ).values_list('charname', 'id')
         )
-        item = Inventory.objects.get(
-            item_owner_id = getattr(item_owner_record, "id"),
-            item_name = request.data.get('item_name')
+        missing = charnames - set(owners)
+        if missing:
+            return HttpResponse(
+                json.dumps({'error': f"Characters not found: {', '.join(sorted(missing))}"}),
+                status = 404,
+                content_type = 'application/json'
+            )
+        try:
+            Inventory.objects.add_many([
+                {'item_owner_id': owners[charname], 'item_name': item_name, **stack}
+                for (charname, item_name), stack in stacks.items()
+            ])
+        except PostgresException as e:
+            return HttpResponse(
+                json.dumps({'error': 'Someone would be overburdened! Nothing was added.'}),
+                status = 409,
+                content_type = 'application/json'
+            )
+        except OperationalError:
+            return busy()
+        return HttpResponse(
+            status = 200
         )
+
+class ReduceInventoryView(GenericAPIView, UpdateModelMixin):
+
+    """
+       Queries: 2 in one transaction, locking the owner's carried bulk by
+       charname (see InventoryBurdenManager.lock) and a single UPDATE; a
+       third to tell a missing item from a non-consumable one if nothing
+       changed.
+    """
+
+    def patch(self, request, *args, **kwargs):
         is_drop_request = request.data.get('item_drop') or False
-        if getattr(item, 'item_consumable') == False and not is_drop_request:
-            return HttpResponse(status = 200)
-        qty = getattr(item, 'item_qty') - 1
-        setattr(item, 'item_qty', qty)
-        # TODO: This is really a trigger?
-        setattr(item, 'item_bulk', qty * getattr(item, 'item_weight'))
-        item.save()
+        try:
+            with transaction.atomic():
+                owners = InventoryBurden.objects.lock(charname = request.data.get('item_owner'))
+                item = Inventory.objects.filter(
+                    item_owner_id__in = owners,
+                    item_name = request.data.get('item_name')
+                )
+                reducible = item if is_drop_request else item.filter(item_consumable = True)
+                # The decrement_item_qty_trigger deletes the row once it runs out
+                updated = reducible.update(
+                    item_qty = F('item_qty') - 1,
+                    item_bulk = (F('item_qty') - 1) * F('item_weight')
+                )
+        except OperationalError:
+            return busy()
+        if not updated and not item.exists():
+            return HttpResponse(
+                json.dumps({'error': 'Item not found'}),
+                status = 404,
+                content_type = 'application/json'
+            )
         return HttpResponse(status = 200)
 
 class DropInventoryView(APIView):
@@ -93,9 +265,7 @@ class DropInventoryView(APIView):
         item_name = request.data.get('item_name')
         # TODO: Theoretically, as a foreign key, we should be able to page through
         #       inventory objects by name and read the foreign key data? Revisit.
-        item_owner_record = omnipresence.models.OmnipresenceModel.objects.get(
-            charname = request.data.get('item_owner')
-        )
+        item_owner = request.data.get('item_owner')
         if not item_name:
             return Response({"error": "Item name is required"}, status=status.HTTP_400_BAD_REQUEST)
         if not item_owner:
@@ -103,7 +273,7 @@ class DropInventoryView(APIView):
         try:
             inventory_item = Inventory.objects.get(
                 item_name = item_name,
-                item_owner_id = item_owner
+                item_owner__charname = item_owner
             )
             qty = getattr(inventory_item, 'item_qty')
             setattr(inventory_item, 'item_qty', qty - 1)
@@ -116,19 +286,34 @@ class DropInventoryView(APIView):
 
 class ListInventoryView(APIView):
 
+    """
+       Queries: 2, joined on the owner's charname and the items' binaries,
+       then the binaries' chunks; an unknown character simply has an empty
+       inventory. With binaries=false only the item metadata is read and
+       sent; fetch a binary from binary/ when needed.
+    """
+
+    metadata_fields = (
+        'id', 'item_name', 'item_qty', 'item_weight', 'item_bulk',
+        'item_version', 'item_consumable', 'item_owner'
+    )
+
     def get(self, request, *args, **kwargs):
-        # Retrieve ID of inventory holder
-        inventory_owner_data = omnipresence.models.OmnipresenceModel.objects.filter(
-            charname = request.GET.get('charname')
-        ).values('id')
-        # Get information for the inventory holder
-        inventory_owner_id = list(inventory_owner_data)[0]['id']
-        # Filter inventory based on the inventory holder id
+        # Filter inventory by the inventory holder's name
         inventory_items = Inventory.objects.filter(
-            item_owner = inventory_owner_id
+            item_owner__charname = request.GET.get('charname')
         )
+        if request.GET.get('binaries', 'true').lower() in ('false', '0'):
+            return HttpResponse(
+                json.dumps(list(inventory_items.values(*self.metadata_fields))),
+                status=status.HTTP_200_OK,
+                content_type = 'application/json'
+            )
         # Serialize to re-verify, run other checks
-        serializer = InventorySerializer(inventory_items, many=True)
+        serializer = InventorySerializer(
+            inventory_items.select_related('item_blob').prefetch_related('item_blob__chunks'),
+            many=True
+        )
         # Create list representation to transmit back to query
         fields = [obj for obj in serializer.data]
         # Return HTTP response (JSON packet)
@@ -138,23 +323,137 @@ class ListInventoryView(APIView):
             content_type = 'application/json'
         )
 
-class SearchInventoryView(APIView):
+def byte_range(header, size):
+    """
+    The (start, stop) slice of size bytes a Range header asks for, or None
+    to send them all; only a single range is served, and a malformed header
+    is ignored as RFC 9110 allows.
 
-    def post(self, request, *args, **kwargs):
-        item_owner_record = omnipresence.models.OmnipresenceModel.objects.get(
-            charname = request.data.get('charname')
+    Raises:
+        ValueError: If the range lies wholly past the end
+    """
+    match = re.fullmatch(r"\s*bytes\s*=\s*(\d*)\s*-\s*(\d*)\s*", header, re.ASCII)
+    if match is None or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if first == '':
+        # The last n bytes
+        if size == 0 or int(last) == 0:
+            raise ValueError("Empty suffix range")
+        return max(size - int(last), 0), size
+    start = int(first)
+    if last != '' and int(last) < start:
+        return None
+    if start >= size:
+        raise ValueError("Range starts past the end")
+    return start, size if last == '' else min(int(last) + 1, size)
+
+class BinaryInventoryView(APIView):
+
+    """
+       The raw binary of one item, by charname and item_name, streamed
+       with its digest as a strong ETag. If-None-Match answers 304 and a
+       single Range (honouring If-Range) answers 206. Queries: 1 joining
+       the owner by charname for the digest and size, then one per stored
+       chunk the response covers.
+    """
+
+    def get(self, request, *args, **kwargs):
+        blob = Inventory.objects.filter(
+            item_owner__charname = request.GET.get('charname'),
+            item_name = request.GET.get('item_name')
+        ).values_list('item_blob_id', 'item_blob__size', 'item_blob__chunk_size').first()
+        if blob is None:
+            return HttpResponse(
+                status = 404
+            )
+        digest, size, chunk_size = blob
+        etag = quote_etag(digest)
+        # If-None-Match compares weakly, so W/ tags match as well
+        cached = [tag.removeprefix('W/') for tag in parse_etags(request.headers.get('If-None-Match', ''))]
+        if '*' in cached or etag in cached:
+            response = HttpResponse(
+                status = 304
+            )
+            response['ETag'] = etag
+            return response
+        start, stop = 0, size
+        partial = False
+        if 'Range' in request.headers and request.headers.get('If-Range', etag) == etag:
+            try:
+                wanted = byte_range(request.headers['Range'], size)
+            except ValueError:
+                response = HttpResponse(
+                    status = 416
+                )
+                response['Content-Range'] = f"bytes */{size}"
+                return response
+            if wanted is not None:
+                start, stop = wanted
+                partial = True
+        response = StreamingHttpResponse(
+            streamed(request, InventoryBlob.objects.read(digest, start, stop, chunk_size)),
+            status = 206 if partial else 200,
+            content_type = 'application/octet-stream'
         )
-        item = Inventory.objects.get(
-            item_owner_id = getattr(item_owner_record, "id"),
-            item_name = request.data.get('item_name')
+        response['Content-Length'] = stop - start
+        response['ETag'] = etag
+        response['Accept-Ranges'] = 'bytes'
+        if partial:
+            response['Content-Range'] = f"bytes {start}-{stop - 1}/{size}"
+        return response
+
+class CapacityInventoryView(APIView):
+
+    """
+       Queries: 1, the character by charname with its maintained total
+       left-joined; an unknown character is a 404, and one who never
+       carried anything has no total yet and carries nothing.
+    """
+
+    def get(self, request, *args, **kwargs):
+        owner = omnipresence.models.OmnipresenceModel.objects.filter(
+            charname = request.GET.get('charname')
+        ).values_list('id', 'burden__carried_bulk').first()
+        if owner is None:
+            return HttpResponse(
+                status = 404
+            )
+        carried = owner[1] or 0.0
+        return HttpResponse(
+            json.dumps({
+                "carried": carried,
+                "capacity": CARRYING_CAPACITY,
+                "remaining": CARRYING_CAPACITY - carried
+            }),
+            status = 200,
+            content_type = 'application/json'
         )
-        if not item:
+
+class SearchInventoryView(APIView):
+
+    """
+       Queries: 2, joined on the owner's charname and the item's binary,
+       then the binary's chunks.
+    """
+
+    def post(self, request, *args, **kwargs):
+        try:
+            # as_dict() reads item_owner and item_blob; fetch them over the same join
+            item = Inventory.objects.select_related('item_owner', 'item_blob').prefetch_related(
+                'item_blob__chunks'
+            ).get(
+                item_owner__charname = request.data.get('charname'),
+                item_name = request.data.get('item_name')
+            )
+        except Inventory.DoesNotExist:
             return HttpResponse(
                 status = 404
             )
         response = item.as_dict()
         del response['item_owner']
-        response["item_bytestring"] = response['item_bytestring'].hex()
+        del response['item_blob']
+        response["item_bytestring"] = bytes(item.item_blob.data).hex()
         return HttpResponse(
             json.dumps(response),
             status = 200,
@@ -163,61 +462,81 @@ class SearchInventoryView(APIView):
 
 class GiveInventoryView(GenericAPIView, UpdateModelMixin):
 
+    """
+       Gives item_qty (default 1) of item_name, or with a batch form several
+       items at once: items = [{"item_name": ..., "item_qty": ...}, ...].
+       Either everything is moved or nothing is (see
+       InventoryManager.transfer); queries: 1 for the two characters, then
+       5 in one transaction, whatever the number of items.
+    """
+
     def patch(self, request, to_charname, *args, **kwargs):
-        item_name = request.data.get('item_name')
-        # Retrieve the two parties' information
         try:
-            item_owner_record = omnipresence.models.OmnipresenceModel.objects.get(
-                charname = request.data.get('charname')
-            )
-            item_receiver_record = omnipresence.models.OmnipresenceModel.objects.get(
-                charname = to_charname
+            quantities = self.quantities(request.data)
+        except (TypeError, ValueError, KeyError):
+            return HttpResponse(
+                json.dumps({'error': 'Give item_name and item_qty, or a list of them as items'}),
+                status = 400,
+                content_type = 'application/json'
             )
-        except OmnipresenceModel.DoesNotExist:
+        # Retrieve the two parties' ids from the database itself; a cached
+        # answer may be stale after a rename and move the wrong items
+        charname = request.data.get('charname')
+        parties = dict(omnipresence.models.OmnipresenceModel.objects.filter(
+            charname__in = [charname, to_charname]
+        ).values_list('charname', 'id'))
+        if charname == to_charname or len(parties) != 2:
             return HttpResponse(
                 status = 400
             )
-        # Get the item given from owner's inventory
-        item = Inventory.objects.get(
-            item_owner_id = getattr(item_owner_record, "id"),
-            item_name = item_name
-        )
-        # If nothing, let's cause a ruckus
-        if not item:
+        item_owner_id, item_receiver_id = parties[charname], parties[to_charname]
+        try:
+            Inventory.objects.transfer(item_owner_id, item_receiver_id, quantities)
+        except Inventory.DoesNotExist as e:
             return HttpResponse(
-                status = 404
+                json.dumps({'error': str(e)}),
+                status = 404,
+                content_type = 'application/json'
             )
-        # Convert to dictionary to separate from original instance
-        item_params = item.as_dict()
-        del item_params['id'] # Delete the giver's object ID
-        # Transfer owner ID
-        item_params['item_owner_id'] = getattr(item_receiver_record, 'id')
-        # Get or create; do we necessarily need to issue a search in receiver's
-        # inventory first? Probably.
-        # TODO: Consider what happens if they're not the same binary; probably
-        #       reject
-        given_item, created = Inventory.objects.get_or_create(
-            item_owner_id = getattr(item_receiver_record, 'id'),
-            item_name = item_name
-        )
-        # Set some sensible baselines for quanitity and bulk
-        qty = 1
-        weight = getattr(item, 'item_weight')
-        if not created: # Some amount already existed in receiver's inventory
-            qty = getattr(given_item, 'item_qty') + 1
-        # Set properties of given record to reflect actual amounts, bulk
-        # TODO: Reject if amount given is greater than space available -- this is a trigger
-        item_params['item_qty'] = qty
-        item_params['item_bulk'] = qty * weight
-        # Regardless of creation, let's set up the whole record
-        for param in item_params:
-            setattr(given_item, param, item_params[param])
-        given_item.save()
-        # Update original item from giver's inventory to reflect new amounts, bulk
-        setattr(item, 'item_qty', getattr(item, 'item_qty') - 1)
-        setattr(item, 'item_bulk', getattr(item, 'item_qty') * getattr(item, 'item_weight'))
-        item.save()
+        except ValueError as e:
+            return HttpResponse(
+                json.dumps({'error': str(e)}),
+                status = 409,
+                content_type = 'application/json'
+            )
+        except PostgresException as e:
+            return HttpResponse(
+                json.dumps({'error': f'{to_charname} is overburdened!'}),
+                status = 409,
+                content_type = 'application/json'
+            )
+        except OperationalError:
+            return busy()
         # Return successful transaction status; TODO: Add a message for both giver and receiver?
         return HttpResponse(
             status = 200
-        )
\ No newline at end of file
+        )
+
+    @staticmethod
+    def quantities(data):
+        """
+        Read the items to give as {item_name: qty}, adding up repeats.
+        """
+        items = data.get('items')
+        if items is None:
+            items = [{
+                'item_name': data.get('item_name'),
+                'item_qty': data.get('item_qty', 1)
+            }]
+        elif isinstance(items, str): # Sent as a form field
+            items = json.loads(items)
+        quantities = {}
+        for item in items:
+            item_name = item['item_name']
+            qty = quantity(item.get('item_qty', 1))
+            if not item_name:
+                raise ValueError(item)
+            quantities[item_name] = quantities.get(item_name, 0) + qty
+        if not quantities:
+            raise ValueError(items)
+        return quantities
\ No newline at end of file
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class OmnipresenceConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'omnipresence'
+
+    def ready(self):
+        from omnipresence import signals
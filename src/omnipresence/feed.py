@@ -0,0 +1,122 @@
+import asyncio
+import json
+import logging
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+
+from omnipresence.models import OmnipresenceModel
+
+logger = logging.getLogger(__name__)
+
+
+def changes(before, after):
+    """
+    Yield (event, row) for every difference between two presence snapshots.
+
+    Snapshots map pk to the row of an active character; a character that
+    appears is "joined", one that disappears is "left", and one whose
+    working_dir changed is "moved", with its previous directory in "from".
+    """
+    for pk, row in after.items():
+        old = before.get(pk)
+        if old is None:
+            yield "joined", row
+        elif old["working_dir"] != row["working_dir"]:
+            yield "moved", {**row, "from": old["working_dir"]}
+    for pk, row in before.items():
+        if pk not in after:
+            yield "left", row
+
+
+class PresenceFeed:
+    """
+    Watches active characters once per process and fans changes out.
+
+    A single poller reads the active rows every interval seconds, diffs them
+    against the previous read and puts each change on every subscriber's
+    queue, so the database sees one query per interval however many clients
+    are listening. The poller runs only while someone is subscribed. A
+    subscriber that falls backlog events behind is dropped; its client is
+    expected to reconnect and start again from a fresh snapshot.
+    """
+
+    def __init__(self, interval, backlog = 100):
+        self.interval = interval
+        self.backlog = backlog
+        self.queues = set()
+        self.listeners = 0
+        self.current = None
+        self.ready = None
+        self.poller = None
+
+    async def subscribe(self):
+        """
+        Start listening for changes.
+
+        Returns:
+            tuple: The subscriber's asyncio.Queue and a list of the rows that
+            were active when it started; pass the queue to unsubscribe when
+            done. The queue yields (event, row) pairs, or None once dropped.
+        """
+        self.listeners += 1
+        if self.poller is None or self.poller.done():
+            self.current = None
+            self.ready = asyncio.Event()
+            self.poller = asyncio.create_task(self._run())
+        try:
+            await self.ready.wait()
+        except BaseException:
+            self.listeners -= 1
+            raise
+        # No await from here on, so no change can slip between the two
+        queue = asyncio.Queue(self.backlog)
+        self.queues.add(queue)
+        return queue, list(self.current.values())
+
+    def unsubscribe(self, queue):
+        if queue in self.queues:
+            self.queues.discard(queue)
+            self.listeners -= 1
+
+    def publish(self, event, row):
+        for queue in list(self.queues):
+            try:
+                queue.put_nowait((event, row))
+            except asyncio.QueueFull:
+                self.unsubscribe(queue)
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(None)
+
+    @staticmethod
+    def load():
+        close_old_connections()
+        return {
+            row["pk"]: row
+            for row in OmnipresenceModel.objects.filter(
+                is_active = True
+            ).values('pk', 'username', 'charname', 'working_dir')
+        }
+
+    async def _run(self):
+        while self.listeners:
+            try:
+                rows = await sync_to_async(self.load)()
+            except Exception:
+                logger.warning("Could not read presence for the feed", exc_info = True)
+            else:
+                if self.current is not None:
+                    for event, row in changes(self.current, rows):
+                        self.publish(event, row)
+                self.current = rows
+                self.ready.set()
+            await asyncio.sleep(self.interval)
+
+
+def server_sent_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+feed = PresenceFeed(settings.PRESENCE_FEED_INTERVAL)
@@ -0,0 +1,121 @@
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.utils import timezone
+
+from omnipresence.models import OmnipresenceModel
+
+logger = logging.getLogger(__name__)
+
+
+class HeartbeatBuffer:
+    """
+    Collects presence heartbeats in memory and writes them out in bulk.
+
+    Each heartbeat only replaces the pending entry for its character, so
+    however often a client beats, one row change per character is written
+    per flush. A background thread flushes every interval seconds with a
+    single UPDATE ... FROM (VALUES ...) per batch_size characters.
+
+    When sweep_interval is set, the same thread also expires characters
+    that have gone quiet (see OmnipresenceManager.expire) that often. It
+    is started by the first heartbeat, or by start(); see
+    omnipresence.signals for the latter.
+    """
+
+    def __init__(self, interval, batch_size = 1000, sweep_interval = 0, ttl = 0):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.sweep_interval = sweep_interval
+        self.ttl = ttl
+        self.last_sweep = time.monotonic()
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.flusher = None
+
+    def beat(self, pk, is_active = True):
+        """
+        Record that character pk was seen just now.
+        """
+        with self.lock:
+            self.pending[pk] = (timezone.now(), is_active)
+        self.start()
+
+    def start(self):
+        """
+        Start the background thread, unless it is running already.
+        """
+        if self.flusher is not None:
+            return
+        with self.lock:
+            if self.flusher is None:
+                self.flusher = threading.Thread(target = self._run, daemon = True)
+                self.flusher.start()
+                atexit.register(self.flush)
+
+    def flush(self):
+        """
+        Write every pending heartbeat; returns the number of rows updated.
+        """
+        with self.lock:
+            batch, self.pending = self.pending, {}
+        if not batch:
+            return 0
+        items = list(batch.items())
+        updated = 0
+        try:
+            for start in range(0, len(items), self.batch_size):
+                updated += self._write(items[start:start + self.batch_size])
+        except Exception:
+            # Put the beats back unless newer ones arrived meanwhile
+            with self.lock:
+                for pk, beat in items:
+                    self.pending.setdefault(pk, beat)
+            raise
+        return updated
+
+    def _write(self, items):
+        table = connection.ops.quote_name(OmnipresenceModel._meta.db_table)
+        rows = ", ".join(["(%s::bigint, %s::timestamptz, %s::boolean)"] * len(items))
+        params = []
+        for pk, (last_active, is_active) in items:
+            params.extend([pk, last_active, is_active])
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                UPDATE {table} AS presence
+                SET last_active = beats.last_active, is_active = beats.is_active
+                FROM (VALUES {rows}) AS beats (id, last_active, is_active)
+                WHERE presence.id = beats.id
+                """,
+                params
+            )
+            return cursor.rowcount
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                close_old_connections()
+                self.flush()
+            except Exception:
+                logger.warning("Could not flush presence heartbeats", exc_info = True)
+                continue
+            # Sweep only after a successful flush, so fresh beats count
+            if self.sweep_interval and time.monotonic() - self.last_sweep >= self.sweep_interval:
+                self.last_sweep = time.monotonic()
+                try:
+                    OmnipresenceModel.objects.expire(self.ttl)
+                except Exception:
+                    logger.warning("Could not expire idle characters", exc_info = True)
+
+
+heartbeats = HeartbeatBuffer(
+    settings.PRESENCE_FLUSH_INTERVAL,
+    sweep_interval = settings.PRESENCE_SWEEP_INTERVAL,
+    ttl = settings.PRESENCE_TTL
+)
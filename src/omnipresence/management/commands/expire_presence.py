@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from omnipresence.models import OmnipresenceModel
+
+
+class Command(BaseCommand):
+
+    help = "Mark characters inactive when they have not been seen for a while; suitable for cron."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--ttl",
+            type = int,
+            default = settings.PRESENCE_TTL,
+            help = "Seconds without activity before a character is inactive"
+        )
+
+    def handle(self, *args, **options):
+        expired = OmnipresenceModel.objects.expire(options["ttl"])
+        self.stdout.write(f"Marked {expired} character(s) inactive")
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('omnipresence', '0004_remove_omnipresencemodel_update_character_activity'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='omnipresencemodel',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['last_active'], name='omnipresence_active_seen'),
+        ),
+    ]
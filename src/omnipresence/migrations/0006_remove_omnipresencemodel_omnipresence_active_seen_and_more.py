@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('omnipresence', '0005_omnipresencemodel_omnipresence_active_seen'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='omnipresencemodel',
+            name='omnipresence_active_seen',
+        ),
+        migrations.AddIndex(
+            model_name='omnipresencemodel',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['last_active', 'id'], name='omnipresence_active_seen'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('omnipresence', '0006_remove_omnipresencemodel_omnipresence_active_seen_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='omnipresencemodel',
+            index=models.Index(fields=['working_dir'], name='omnipresence_working_dir_tree', opclasses=['varchar_pattern_ops']),
+        ),
+    ]
@@ -1,9 +1,46 @@
 import pgtrigger
-from datetime import datetime
+from datetime import datetime, timedelta
 from django.db import models
+from django.utils import timezone
+
+class OmnipresenceManager(models.Manager):
+
+    def expire(self, ttl):
+        """
+        Mark characters inactive once they have not been seen for ttl seconds.
+
+        A single UPDATE, served by the partial index on active rows; being a
+        queryset update it leaves last_active untouched.
+
+        Returns:
+            int: The number of characters marked inactive
+        """
+        cutoff = timezone.now() - timedelta(seconds = ttl)
+        return self.filter(
+            is_active = True,
+            last_active__lt = cutoff
+        ).update(is_active = False)
 
 class OmnipresenceModel(models.Model):
 
+    class Meta:
+        indexes = [
+            # Serves the expiry sweep and keyset pages of active characters
+            models.Index(
+                fields = ["last_active", "id"],
+                condition = models.Q(is_active = True),
+                name = "omnipresence_active_seen"
+            ),
+            # Lets LIKE 'prefix%' subtree lookups use an index in any collation
+            models.Index(
+                fields = ["working_dir"],
+                opclasses = ["varchar_pattern_ops"],
+                name = "omnipresence_working_dir_tree"
+            )
+        ]
+
+    objects = OmnipresenceManager()
+
     username = models.CharField(max_length = 255)
     charname = models.CharField(max_length = 255, unique = True)
     working_dir = models.CharField(max_length = 512)
@@ -0,0 +1,24 @@
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from rest_framework.renderers import BaseRenderer
+
+
+class NDJSONRenderer(BaseRenderer):
+
+    """
+       Newline-delimited JSON: one object per line. Selected with
+       ?format=ndjson or Accept: application/x-ndjson.
+    """
+
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type = None, renderer_context = None):
+        return ''.join(self.lines(data)).encode(self.charset)
+
+    @staticmethod
+    def lines(rows):
+        for row in rows:
+            yield json.dumps(row, cls = DjangoJSONEncoder) + '\n'
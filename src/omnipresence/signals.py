@@ -0,0 +1,12 @@
+from django.conf import settings
+from django.core.signals import request_started
+from django.dispatch import receiver
+
+from omnipresence.heartbeats import heartbeats
+
+
+@receiver(request_started)
+def start_presence_sweeps(sender, **kwargs):
+    # Every serving process sweeps, whether or not its clients send heartbeats
+    if settings.PRESENCE_SWEEP_INTERVAL:
+        heartbeats.start()
@@ -1,3 +1,53 @@
-from django.test import TestCase
+import base64
+import json
+from datetime import datetime, timezone
 
-# Create your tests here.
+from django.test import SimpleTestCase
+
+from omnipresence.feed import changes
+from omnipresence.views import decode_cursor, encode_cursor
+
+
+class CursorTests(SimpleTestCase):
+
+    def test_round_trip(self):
+        last_active = datetime(2024, 5, 1, 12, 30, tzinfo = timezone.utc)
+        self.assertEqual(decode_cursor(encode_cursor(last_active, 42)), (last_active, 42))
+
+    def test_garbage_is_refused(self):
+        for cursor in ("", "not base64!", base64.urlsafe_b64encode(b"not json").decode()):
+            with self.subTest(cursor = cursor):
+                self.assertIsNone(decode_cursor(cursor))
+
+    def test_malformed_positions_are_refused(self):
+        positions = (
+            ["2024-05-01T12:30:00+00:00"],
+            ["2024-05-01T12:30:00+00:00", "42"],
+            ["yesterday", 42],
+            [None, 42],
+            {"last_active": "2024-05-01T12:30:00+00:00", "id": 42},
+        )
+        for position in positions:
+            cursor = base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+            with self.subTest(position = position):
+                self.assertIsNone(decode_cursor(cursor))
+
+
+class ChangesTests(SimpleTestCase):
+
+    def row(self, pk, working_dir):
+        return {"id": pk, "charname": f"char{pk}", "working_dir": working_dir}
+
+    def test_joined_moved_and_left(self):
+        before = {1: self.row(1, "/home"), 2: self.row(2, "/home"), 3: self.row(3, "/tmp")}
+        after = {1: self.row(1, "/home"), 2: self.row(2, "/srv"), 4: self.row(4, "/")}
+        self.assertEqual(sorted(changes(before, after), key = lambda change: change[1]["id"]), [
+            ("moved", {**self.row(2, "/srv"), "from": "/home"}),
+            ("left", self.row(3, "/tmp")),
+            ("joined", self.row(4, "/")),
+        ])
+
+    def test_unchanged_snapshots_yield_nothing(self):
+        snapshot = {1: self.row(1, "/home")}
+        self.assertEqual(list(changes(snapshot, dict(snapshot))), [])
+        self.assertEqual(list(changes({}, {})), [])
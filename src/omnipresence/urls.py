@@ -2,8 +2,10 @@ from . import views
 from django.urls import path, re_path
 
 urlpatterns  = [
-    path('', views.OmnipresenceView.as_view()),
-    re_path(r'update/(?P<pk>\d+)/', views.OmnipresenceUpdateView.as_view()),
-    re_path(r'active/', views.OmnipresenceActiveView.as_view()),
-    re_path(r'local/', views.OmnipresenceActiveView.as_view())
+    path('', views.OmnipresenceView.as_view(), name = 'omnipresence'),
+    re_path(r'update/(?P<pk>\d+)/', views.OmnipresenceUpdateView.as_view(), name = 'omnipresence-update'),
+    re_path(r'heartbeat/(?P<pk>\d+)/', views.OmnipresenceHeartbeatView.as_view(), name = 'omnipresence-heartbeat'),
+    re_path(r'feed/', views.OmnipresenceFeedView.as_view(), name = 'omnipresence-feed'),
+    re_path(r'active/', views.OmnipresenceActiveView.as_view(), name = 'omnipresence-active'),
+    re_path(r'local/', views.OmnipresenceActiveView.as_view(), name = 'omnipresence-local')
 ]
@@ -1,14 +1,27 @@
 import json
+import base64
+import asyncio
+from collections import Counter
 
 from django.core import serializers
-from django.http import HttpResponse
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.views import View
 from rest_framework.views import APIView
 from rest_framework.generics import GenericAPIView
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny
 from rest_framework.mixins import UpdateModelMixin
+from rest_framework.settings import api_settings
 from omnipresence.models import OmnipresenceModel
 from omnipresence.serializer import OmnipresenceSerializer
+from omnipresence.renderers import NDJSONRenderer
+from omnipresence.heartbeats import heartbeats
+from omnipresence.feed import feed, server_sent_event
+from core.streaming import streamed
 
 class OmnipresenceView(GenericAPIView):
 
@@ -38,26 +51,151 @@ class OmnipresenceView(GenericAPIView):
             return Response(status = 201)
         return Response(serializer.errors, status = 400)
 
+def encode_cursor(last_active, pk):
+    position = json.dumps([last_active.isoformat(), pk])
+    return base64.urlsafe_b64encode(position.encode()).decode()
+
+def decode_cursor(cursor):
+    try:
+        last_active, pk = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        last_active = parse_datetime(last_active)
+    except (ValueError, TypeError):
+        return None
+    if last_active is None or not isinstance(pk, int):
+        return None
+    return last_active, pk
+
 class OmnipresenceActiveView(GenericAPIView):
 
+    """
+       GET lists active characters, least recently seen first.
+
+       ?fields= picks the columns (username and charname by default),
+       ?limit= pages the list, with the cursor for the next page returned in
+       the X-Next-Cursor header and passed back as ?cursor=, and
+       ?format=ndjson (or Accept: application/x-ndjson) gives one JSON
+       object per line instead of an array, streamed when not paged.
+       Pages are keyed on (last_active, id) rather than offsets, so each one
+       is a single index range scan however deep into the list it is.
+
+       POST lists the characters whose working_dir is cwd. With subtree set
+       it also takes every directory below cwd, answering with the
+       characters and an occupancy count per directory.
+    """
+
     queryset = OmnipresenceModel.objects.all()
+    renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES + [NDJSONRenderer]
+
+    listable_fields = ('pk', 'username', 'charname', 'working_dir', 'last_active')
+    default_fields = ('username', 'charname')
+    max_limit = 1000
+    chunk_size = 500
 
     def get(self, request, *args, **kwargs):
-        actives = OmnipresenceModel.objects.filter(
-            is_active = True
-        ).values('username','charname')
-        return HttpResponse(
-            json.dumps(list(actives)),
-            status = 200,
-            content_type = 'application/json'
-        )
+        fields = self.default_fields
+        if request.GET.get('fields'):
+            fields = tuple(request.GET['fields'].split(','))
+            unknown = set(fields) - set(self.listable_fields)
+            if unknown:
+                return HttpResponse(
+                    json.dumps({"error": f"Unknown fields: {', '.join(sorted(unknown))}"}),
+                    status = 400,
+                    content_type = 'application/json'
+                )
+
+        limit = request.GET.get('limit')
+        if limit is not None:
+            if not limit.isdigit() or not 0 < int(limit) <= self.max_limit:
+                return HttpResponse(
+                    json.dumps({"error": f"limit must be between 1 and {self.max_limit}"}),
+                    status = 400,
+                    content_type = 'application/json'
+                )
+            limit = int(limit)
+
+        actives = OmnipresenceModel.objects.filter(is_active = True)
+        if request.GET.get('cursor'):
+            position = decode_cursor(request.GET['cursor'])
+            if position is None:
+                return HttpResponse(
+                    json.dumps({"error": "Invalid cursor"}),
+                    status = 400,
+                    content_type = 'application/json'
+                )
+            last_active, pk = position
+            actives = actives.filter(
+                Q(last_active__gt = last_active) |
+                Q(last_active = last_active, id__gt = pk)
+            )
+        # Ascending, so a row seen again meanwhile moves ahead of the cursor
+        # and is listed twice rather than skipped
+        actives = actives.order_by('last_active', 'id')
+        ndjson = request.accepted_renderer.format == 'ndjson'
+
+        if limit is None:
+            rows = actives.values(*fields)
+            if ndjson:
+                return StreamingHttpResponse(
+                    streamed(request, NDJSONRenderer.lines(rows.iterator(chunk_size = self.chunk_size))),
+                    content_type = NDJSONRenderer.media_type
+                )
+            return HttpResponse(
+                json.dumps(list(rows), cls = DjangoJSONEncoder),
+                status = 200,
+                content_type = 'application/json'
+            )
+
+        # Fetch one row more than asked to learn whether there is a next page
+        page = list(actives.values(*set(fields) | {'id', 'last_active'})[:limit + 1])
+        following = len(page) > limit
+        page = page[:limit]
+        rows = [{field: row[field] for field in fields} for row in page]
+        if ndjson:
+            response = HttpResponse(
+                NDJSONRenderer().render(rows),
+                status = 200,
+                content_type = NDJSONRenderer.media_type
+            )
+        else:
+            response = HttpResponse(
+                json.dumps(rows, cls = DjangoJSONEncoder),
+                status = 200,
+                content_type = 'application/json'
+            )
+        if following:
+            response['X-Next-Cursor'] = encode_cursor(page[-1]['last_active'], page[-1]['id'])
+        return response
 
     def post(self, request, *args, **kwargs):
-        local_actives = OmnipresenceModel.objects.filter(
-            working_dir = request.data.get('cwd')
-        ).values('charname')
+        cwd = request.data.get('cwd')
+        if str(request.data.get('subtree', False)).lower() in ('false', '0'):
+            local_actives = OmnipresenceModel.objects.filter(
+                working_dir = cwd
+            ).values('charname')
+            return HttpResponse(
+                json.dumps(list(local_actives)),
+                status = 200,
+                content_type = 'application/json'
+            )
+
+        # Everyone in cwd or below it, with a head count per directory
+        if not cwd:
+            return HttpResponse(
+                json.dumps({"error": "cwd is required"}),
+                status = 400,
+                content_type = 'application/json'
+            )
+        subtree = OmnipresenceModel.objects.filter(
+            Q(working_dir = cwd) |
+            Q(working_dir__startswith = cwd.rstrip('/') + '/')
+        ).order_by('working_dir', 'charname').values('charname', 'working_dir')
+        characters = list(subtree)
+        occupancy = Counter(row['working_dir'] for row in characters)
         return HttpResponse(
-            json.dumps(list(local_actives)),
+            json.dumps({
+                "characters": characters,
+                "occupancy": dict(occupancy)
+            }),
             status = 200,
             content_type = 'application/json'
         )
@@ -69,3 +207,64 @@ class OmnipresenceUpdateView(GenericAPIView, UpdateModelMixin):
 
     def patch(self, request, *args, **kwargs):
         return self.partial_update(request, *args, **kwargs)
+
+class OmnipresenceHeartbeatView(APIView):
+
+    """
+       Cheap alternative to PATCHing update/<pk>/ just to stay active: the
+       beat is buffered in memory and written with everyone else's in the
+       next bulk flush, so last_active lags by up to PRESENCE_FLUSH_INTERVAL.
+    """
+
+    def post(self, request, pk, *args, **kwargs):
+        is_active = str(request.data.get('is_active', True)).lower() not in ('false', '0')
+        heartbeats.beat(int(pk), is_active)
+        return HttpResponse(status = 204)
+
+class OmnipresenceFeedView(View):
+
+    """
+       Server-sent events replacing polls of active/ and local/: a
+       "snapshot" event lists who is active on connect, then "joined",
+       "left" and "moved" events follow as presence changes. ?cwd= limits
+       both to one working directory. Needs the ASGI server, since each
+       listener holds its connection open.
+    """
+
+    keepalive = 15
+
+    async def get(self, request, *args, **kwargs):
+        if not isinstance(request, ASGIRequest):
+            return JsonResponse(
+                {"detail": "The presence feed is only served over ASGI"},
+                status = 501
+            )
+        cwd = request.GET.get('cwd')
+        queue, snapshot = await feed.subscribe()
+        response = StreamingHttpResponse(
+            self.stream(queue, snapshot, cwd),
+            content_type = 'text/event-stream'
+        )
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    async def stream(self, queue, snapshot, cwd):
+        try:
+            yield server_sent_event('snapshot', [
+                row for row in snapshot
+                if cwd is None or row['working_dir'] == cwd
+            ])
+            while True:
+                try:
+                    change = await asyncio.wait_for(queue.get(), self.keepalive)
+                except asyncio.TimeoutError:
+                    yield ': keepalive\n\n'
+                    continue
+                if change is None:
+                    return
+                event, row = change
+                if cwd is None or cwd in (row['working_dir'], row.get('from')):
+                    yield server_sent_event(event, row)
+        finally:
+            feed.unsubscribe(queue)
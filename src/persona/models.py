@@ -1,5 +1,7 @@
 from django.db import models
 
+from omnipresence.models import OmnipresenceModel
+
 class PersonaModel(models.Model):
 
     assistant_name = models.CharField(max_length = 255)
@@ -17,8 +19,42 @@ class PersonaModel(models.Model):
             result[field.name] = getattr(self, field.name)
         return result
 
+class PersonaThreadManager(models.Manager):
+
+    def for_character(self, charname, persona_name):
+        """
+        Return (thread, created) for charname's conversation with the persona
+        called persona_name, with the persona loaded as assistant_id.
+
+        A thread that exists is found in one query joining the character and
+        the persona by name; they are only looked up on their own, to create
+        it, on a character's first message to a persona.
+
+        Raises:
+            OmnipresenceModel.DoesNotExist: If there is no such character
+            PersonaModel.DoesNotExist: If there is no such persona
+        """
+        thread = self.select_related('assistant_id').filter(
+            thread_owner__charname = charname,
+            assistant_id__assistant_name = persona_name
+        ).first()
+        if thread is not None:
+            return thread, False
+        assistant = PersonaModel.objects.get(
+            assistant_name = persona_name
+        )
+        owner_id = OmnipresenceModel.objects.values_list(
+            'id', flat = True
+        ).get(charname = charname)
+        return self.get_or_create(
+            thread_owner_id = owner_id,
+            assistant_id = assistant
+        )
+
 class PersonaThreadModel(models.Model):
 
+    objects = PersonaThreadManager()
+
     thread_owner = models.ForeignKey(
         'omnipresence.OmnipresenceModel',
         on_delete = models.DO_NOTHING,
@@ -1,3 +1,46 @@
 from django.test import TestCase
 
-# Create your tests here.
+from omnipresence.models import OmnipresenceModel
+from persona.models import PersonaModel, PersonaThreadModel
+
+
+class ThreadForCharacterTests(TestCase):
+
+    def setUp(self):
+        self.ann = OmnipresenceModel.objects.create(username = "ann", charname = "ann", working_dir = "/")
+        self.persona = PersonaModel.objects.create(
+            assistant_name = "sage",
+            assistant_id = "asst_1",
+            assistant_owner = self.ann
+        )
+
+    def test_first_message_creates_the_thread(self):
+        thread, created = PersonaThreadModel.objects.for_character("ann", "sage")
+        self.assertTrue(created)
+        self.assertEqual(thread.thread_owner_id, self.ann.id)
+        self.assertEqual(thread.assistant_id, self.persona)
+
+    def test_existing_thread_is_found_in_one_query(self):
+        PersonaThreadModel.objects.create(thread_owner = self.ann, assistant_id = self.persona, thread_id = "t1")
+        with self.assertNumQueries(1):
+            thread, created = PersonaThreadModel.objects.for_character("ann", "sage")
+            self.assertEqual(thread.assistant_id.assistant_id, "asst_1")
+        self.assertFalse(created)
+        self.assertEqual(thread.thread_id, "t1")
+
+    def test_renamed_character_keeps_its_thread(self):
+        PersonaThreadModel.objects.create(thread_owner = self.ann, assistant_id = self.persona, thread_id = "t1")
+        self.ann.charname = "anna"
+        self.ann.save()
+        OmnipresenceModel.objects.create(username = "ann2", charname = "ann", working_dir = "/")
+        thread, created = PersonaThreadModel.objects.for_character("anna", "sage")
+        self.assertEqual(thread.thread_id, "t1")
+        thread, created = PersonaThreadModel.objects.for_character("ann", "sage")
+        self.assertTrue(created)
+        self.assertNotEqual(thread.thread_owner_id, self.ann.id)
+
+    def test_unknown_names(self):
+        with self.assertRaises(OmnipresenceModel.DoesNotExist):
+            PersonaThreadModel.objects.for_character("nobody", "sage")
+        with self.assertRaises(PersonaModel.DoesNotExist):
+            PersonaThreadModel.objects.for_character("ann", "nobody")
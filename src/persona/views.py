@@ -1,10 +1,11 @@
 import os
 import io
 import json
-import requests
 
-from openai import OpenAI, AssistantEventHandler
+from openai import OpenAI, AssistantEventHandler, DefaultHttpxClient
+from django.conf import settings
 from django.core import serializers
+from django.db.models import Exists, Subquery
 from django.http import HttpResponse
 from django.http import StreamingHttpResponse
 from rest_framework.views import APIView
@@ -14,11 +15,14 @@ from rest_framework.mixins import UpdateModelMixin
 from omnipresence.models import OmnipresenceModel
 from persona.models import PersonaModel, PersonaThreadModel
 from .serializers import PersonaModelSerializer, PersonaThreadSerializer
+from core import http
 
 # TODO: Implement tool_calls and other estoterica
 
 client = OpenAI(
-    api_key = os.getenv('OPEN_AI_KEY')
+    api_key = os.getenv('OPEN_AI_KEY'),
+    base_url = settings.OPEN_AI_URL,
+    http_client = DefaultHttpxClient(transport = http.TimedTransport())
 )
 
 class AssistantStream(AssistantEventHandler):
@@ -43,19 +47,14 @@ class StreamPersonaGenerateView(APIView):
 
     def post(self, request, persona_name, *args, **kwargs):
         assistant_id = None
-        interactor = OmnipresenceModel.objects.get(
-            charname = request.data.get('charname')
-        )
         try:
-            assistant = PersonaModel.objects.get(
-                assistant_name = persona_name
+            interaction, created = PersonaThreadModel.objects.for_character(
+                request.data.get('charname'),
+                persona_name
             )
-        except PersonaModel.DoesNotExist:
+        except (OmnipresenceModel.DoesNotExist, PersonaModel.DoesNotExist):
             return HttpResponse(status = 400)
-        interaction, created = PersonaThreadModel.objects.get_or_create(
-            thread_owner = interactor,
-            assistant_id = assistant
-        )
+        assistant = interaction.assistant_id
         if created:
             thread = client.beta.threads.create()
             setattr(interaction, 'thread_id', thread.id)
@@ -83,19 +82,14 @@ class SyncPersonaGenerateView(APIView):
 
     def post(self, request, persona_name, *args, **kwargs):
         assistant_id = None
-        interactor = OmnipresenceModel.objects.get(
-            charname = request.data.get('charname')
-        )
         try:
-            assistant = PersonaModel.objects.get(
-                assistant_name = persona_name
+            interaction, created = PersonaThreadModel.objects.for_character(
+                request.data.get('charname'),
+                persona_name
             )
-        except PersonaModel.DoesNotExist:
+        except (OmnipresenceModel.DoesNotExist, PersonaModel.DoesNotExist):
             return HttpResponse(status = 400)
-        interaction, created = PersonaThreadModel.objects.get_or_create(
-            thread_owner = interactor,
-            assistant_id = assistant
-        )
+        assistant = interaction.assistant_id
         if created:
             thread = client.beta.threads.create()
             setattr(interaction, 'thread_id', thread.id)
@@ -146,7 +140,7 @@ class SyncPersonaGenerateView(APIView):
                                     raise ForbiddenInventoryError
 
                             # make a GET request to the tool function
-                            response = requests.get(
+                            response = http.session.get(
                                 f"http://localhost:8000{function_name}",
                                 params=function_args,
                             )
@@ -269,17 +263,18 @@ class PersonaCreateView(APIView):
                 json.dumps({"response": "Assistant with that name already exists!"}),
                 status = 400
             )
-        try:
-            creator = OmnipresenceModel.objects.get(
-                charname = persona_creator
-            )
-        except OmnipresenceModel.DoesNotExist:
+        # The creator is found by name within the UPDATE itself, which
+        # changes nothing if there is no such character
+        creator = OmnipresenceModel.objects.filter(
+            charname = persona_creator
+        ).values('id')
+        updated = PersonaModel.objects.filter(pk = persona.pk).filter(Exists(creator)).update(
+            assistant_owner_id = Subquery(creator),
+            assistant_id = id
+        )
+        if not updated:
             return HttpResponse(status = 400)
 
-        setattr(persona, 'assistant_owner', creator)
-        setattr(persona, 'assistant_id', id)
-        persona.save()
-
         return HttpResponse(
             json.dumps({"response": "Assistant created!", "name": name, "id": id}),
             status = 200